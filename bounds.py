@@ -0,0 +1,152 @@
+import numpy as np
+
+# Largest instance held_karp_bound accepts: it works on the dense float64
+# matrix, 8 * n * n bytes (200 MB at 5000 locations) and a copy per step
+MAX_SIZE = 5000
+
+
+def one_tree(w):
+    """
+    Returns the minimum 1-tree of weights w: a minimum spanning tree on the
+    locations 1 to n-1 (Prim's algorithm), plus the two cheapest edges of
+    location 0
+
+    Parameters:
+        w (numpy.ndarray) : n * n symmetric edge weights
+
+    Returns:
+        (cost, degree) :
+                cost:   total weight of the 1-tree
+                degree: number of 1-tree edges of each location
+    """
+    n = len(w)
+    degree = np.zeros(n, dtype=np.int64)
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[:2] = True
+    key = w[1].copy()
+    key[in_tree] = np.inf
+    parent = np.ones(n, dtype=np.intp)
+    cost = 0.0
+    for _ in range(n - 2):
+        j = int(np.argmin(key))
+        cost += key[j]
+        degree[j] += 1
+        degree[parent[j]] += 1
+        in_tree[j] = True
+        key[j] = np.inf
+        closer = (w[j] < key) & ~in_tree
+        key[closer] = w[j][closer]
+        parent[closer] = j
+
+    cheapest = np.argpartition(w[0, 1:], 1)[:2] + 1
+    cost += w[0, cheapest].sum()
+    degree[0] = 2
+    degree[cheapest] += 1
+    return (cost, degree)
+
+
+def held_karp_bound(dist, upper_bound=None, iterations=None, patience=10,
+                    max_size=MAX_SIZE):
+    """
+    Returns the Held-Karp lower bound on the length of a tour: the best
+    minimum 1-tree found by subgradient optimization over location penalties
+    pi, with edge weights dist[i][j] + pi[i] + pi[j]
+
+    Parameters:
+        dist (array)        : n * n symmetric distances
+        upper_bound (float) : length of a known tour, e.g. of a heuristic,
+                              a nearest neighbour tour is used if omitted
+        iterations (int)    : maximum number of subgradient steps, 10 * n
+                              (at most 1000) if omitted
+        patience (int)      : steps without improvement before the step size
+                              is halved
+        max_size (int)      : largest number of locations, the bound needs
+                              the dense n * n matrix
+
+    Returns:
+        bound (float) : lower bound, rounded up if all distances are integer
+
+    Raises:
+        ValueError : if the distances are not symmetric, the 1-tree is no
+                     lower bound on an asymmetric tour, or if there are more
+                     than max_size locations
+    """
+    if len(dist) > max_size:
+        raise ValueError(
+            "The Held-Karp bound of {} locations needs the dense {} MB "
+            "distance matrix, more than max_size={} locations".format(
+                len(dist), 8 * len(dist)**2 // 2**20, max_size))
+    d = np.asarray(dist, dtype=np.float64)
+    if not np.array_equal(d, d.T):
+        raise ValueError("Distances are not symmetric, the Held-Karp bound "
+                         "only holds for symmetric distances")
+    n = len(d)
+    if n < 3:
+        return float(d.sum())
+    if upper_bound is None:
+        upper_bound = _nearest_neighbour_length(d)
+    if iterations is None:
+        iterations = min(10 * n, 1000)
+
+    pi = np.zeros(n)
+    best = -np.inf
+    scale = 2.0
+    idle = 0
+    for _ in range(iterations):
+        cost, degree = one_tree(d + pi[:, None] + pi[None, :])
+        bound = cost - 2 * pi.sum()
+        if bound > best + 1e-9:
+            best = bound
+            idle = 0
+        else:
+            idle += 1
+            if idle >= patience:
+                scale /= 2
+                idle = 0
+
+        g = degree - 2
+        if not g.any() or best >= upper_bound - 1e-9 or scale < 1e-4:
+            # The 1-tree is a tour, or no further improvement is possible
+            break
+        pi += scale * (upper_bound - bound) / (g @ g) * g
+
+    best = min(best, upper_bound)
+    if np.all(d == np.round(d)):
+        return float(np.ceil(best - 1e-6))
+    return float(best)
+
+
+def certified_gap(obj_val, dist, bound=None):
+    """
+    Returns the optimality gap (%) of a tour with objective value obj_val,
+    with respect to the Held-Karp bound
+
+    Parameters:
+        obj_val (float) : length of the tour
+        dist (array)    : n * n symmetric distances
+        bound (float)   : lower bound to use, computed if omitted
+
+    Raises:
+        ValueError : if the bound is computed and the distances are not
+                     symmetric or too large, see held_karp_bound
+    """
+    if bound is None:
+        bound = held_karp_bound(dist, upper_bound=obj_val)
+    return 100 * (obj_val - bound) / obj_val
+
+
+def _nearest_neighbour_length(d):
+    """
+    Returns the length of the nearest neighbour tour from location 0
+    """
+    n = len(d)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    i = 0
+    length = 0.0
+    for _ in range(n - 1):
+        j = int(np.argmin(np.where(visited, np.inf, d[i])))
+        length += d[i, j]
+        visited[j] = True
+        i = j
+    return length + d[i, 0]
@@ -0,0 +1,489 @@
+import math
+import os
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+METRICS = ("EUC_2D", "CEIL_2D", "ATT")
+
+# Provider of every array passed to as_distance_provider, {id(array):
+# provider}, kept as long as a model (or load_tsp) uses the provider
+_providers = weakref.WeakValueDictionary()
+
+
+class DistanceProvider:
+    """
+    Distances between n locations, indexed like an (n, n) numpy array:
+    dist[i] is row i, dist[i, j] a single distance and dist[I, J] the
+    distances of arrays of locations I and J. np.asarray(dist) (or
+    dist.dense()) returns the full matrix.
+
+    Subclasses implement _rows(key) and _pairs(i, j). Rows requested with
+    row(i) are kept in an LRU cache of at most cache_bytes. Inner loops use
+    item(i, j), which returns a single distance as a Python number.
+
+    Arguments:
+        n           (int) : number of locations
+        cache_bytes (int) : memory budget of the row cache
+        path        (str) : file the distances are read from, the
+                            neighbour index is stored next to it
+    """
+
+    dtype = np.dtype(np.int32)
+
+    def __init__(self, n, cache_bytes=2**26, path=None):
+        self.n = n
+        self.shape = (n, n)
+        self.path = path
+        self.cache_rows = cache_bytes // (self.dtype.itemsize * max(n, 1))
+        self._cache = OrderedDict()
+        self._neighbours = {}
+        self._symmetric = None
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self._pairs(*key)
+        if isinstance(key, (int, np.integer)):
+            return self.row(key)
+        return self._rows(key)
+
+    def __array__(self, dtype=None, copy=None):
+        dist = self.dense()
+        return dist if dtype is None else dist.astype(dtype, copy=False)
+
+    def __getstate__(self):
+        # The row cache and the source array are not sent to worker
+        # processes
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        state.pop("_source", None)
+        return state
+
+    def item(self, i, j):
+        """
+        Returns the distance from location i to location j as a Python number
+        """
+        return self._pairs(i, j).item()
+
+    def row(self, i):
+        """
+        Returns the (read-only) distances from location i to all locations
+        """
+        cache = self._cache
+        if i in cache:
+            cache.move_to_end(i)
+            return cache[i]
+        row = self._rows(i)
+        if self.cache_rows > 0:
+            row.flags.writeable = False
+            cache[i] = row
+            if len(cache) > self.cache_rows:
+                cache.popitem(last=False)
+        return row
+
+    def neighbours(self, k):
+        """
+        Returns the k nearest neighbours of every location as an (n, k)
+        int32 array, see neighbour_lists. The index is computed once: it is
+        kept in memory, where smaller k reuse it, and stored next to the
+        instance file as {name}.knn{k}.npy.
+        """
+        k = min(k, self.n - 1)
+        for size, index in self._neighbours.items():
+            if size >= k:
+                return index[:, :k]
+
+        file = self._sidecar("knn{}".format(k))
+        if file is not None and os.path.exists(file) and (
+                os.path.getmtime(file) >= os.path.getmtime(self.path)):
+            index = np.load(file)
+        else:
+            index = self._nearest(k).astype(np.int32)
+            index.flags.writeable = False
+            if file is not None:
+                try:
+                    np.save(file, index)
+                except OSError:
+                    # Read-only data directory, run without cache
+                    pass
+        self._neighbours[k] = index
+        return index
+
+    def _nearest(self, k):
+        return neighbour_lists(self, k)
+
+    def _sidecar(self, name):
+        """
+        Returns the path of sidecar file name of the instance file, None if
+        the distances are not read from a file
+        """
+        if self.path is None:
+            return None
+        base = self.path
+        if base.endswith(".dist.npy"):
+            base = base[:-len(".dist.npy")]
+        else:
+            base = os.path.splitext(base)[0]
+        return "{}.{}.npy".format(base, name)
+
+    def symmetric(self):
+        """
+        Returns True if dist[i, j] == dist[j, i] for all locations, checked
+        once and one chunk of rows at a time
+        """
+        if self._symmetric is None:
+            chunk = max(1, 2**22 // max(self.n, 1))
+            self._symmetric = all(
+                np.array_equal(
+                    self._rows(slice(start, start + chunk)),
+                    self._pairs(slice(None), slice(start, start + chunk)).T)
+                for start in range(0, self.n, chunk))
+        return self._symmetric
+
+    def dense(self):
+        """
+        Returns the n * n distance matrix
+        """
+        dist = np.empty(self.shape, dtype=self.dtype)
+        # Rows are computed in chunks to limit the temporary memory use
+        chunk = max(1, 2**22 // max(self.n, 1))
+        for start in range(0, self.n, chunk):
+            dist[start:start + chunk] = self._rows(slice(start, start + chunk))
+        return dist
+
+    def to_memmap(self, path):
+        """
+        Writes the distance matrix to the .npy file path, one chunk of rows
+        at a time, and returns it as a MemmapDistances
+        """
+        dist = np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype,
+                                         shape=self.shape)
+        chunk = max(1, 2**22 // max(self.n, 1))
+        for start in range(0, self.n, chunk):
+            dist[start:start + chunk] = self._rows(slice(start, start + chunk))
+        dist.flush()
+        del dist
+        return MemmapDistances(path)
+
+
+class DenseDistances(DistanceProvider):
+    """
+    Distances stored in memory as a numpy array, as int32 if all distances
+    are integer and as float32 if that loses no precision
+
+    Arguments:
+        dist (array) : n * n distances
+    """
+
+    def __init__(self, dist):
+        dist = np.asarray(dist)
+        # Compact arrays are wrapped as is, without a copy
+        if dist.dtype not in (np.int32, np.float32):
+            if np.issubdtype(dist.dtype, np.integer) or np.all(
+                    dist == np.round(dist)):
+                compact = dist.astype(np.int32, copy=False)
+            else:
+                compact = dist.astype(np.float32, copy=False)
+            if np.array_equal(compact, dist):
+                dist = compact
+        self.matrix = dist
+        self.dtype = dist.dtype
+        # Bound directly, item(i, j) is called in the inner loops
+        self.item = dist.item
+        super().__init__(len(dist), cache_bytes=0)
+
+    def __getitem__(self, key):
+        return self.matrix[key]
+
+    def _rows(self, key):
+        return self.matrix[key]
+
+    def _pairs(self, i, j):
+        return self.matrix[i, j]
+
+    def dense(self):
+        return self.matrix
+
+
+class MemmapDistances(DistanceProvider):
+    """
+    Distance matrix in a .npy file that is memory-mapped instead of loaded,
+    rows that are read are kept in the row cache
+
+    Arguments:
+        source (str or numpy.memmap) : path of the .npy file or an already
+                                       memory-mapped array
+        cache_bytes (int)            : memory budget of the row cache
+    """
+
+    def __init__(self, source, cache_bytes=2**26):
+        if isinstance(source, str):
+            source = np.load(source, mmap_mode="r")
+        self.matrix = source
+        self.dtype = source.dtype
+        self.item = source.item
+        super().__init__(len(source), cache_bytes, source.filename)
+
+    def __getstate__(self):
+        # Worker processes map the file again instead of receiving a copy
+        state = super().__getstate__()
+        if getattr(self.matrix, "filename", None) is not None:
+            state["matrix"] = self.matrix.filename
+            del state["item"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if isinstance(self.matrix, str):
+            self.matrix = np.load(self.matrix, mmap_mode="r")
+            self.item = self.matrix.item
+
+    def _rows(self, key):
+        return np.array(self.matrix[key])
+
+    def _pairs(self, i, j):
+        return self.matrix[i, j]
+
+    def dense(self):
+        return self.matrix
+
+
+class CoordinateDistances(DistanceProvider):
+    """
+    Distances between locations, computed from the coordinates when they
+    are needed instead of stored, so an instance needs O(n) memory besides
+    the row cache. Rounding follows TSPLIB: EUC_2D rounds to the nearest
+    integer, CEIL_2D rounds up and ATT is the pseudo-Euclidean distance.
+
+    Arguments:
+        location (numpy.ndarray) : (n, 2) coordinates
+        metric (str)             : "EUC_2D", "CEIL_2D" or "ATT"
+        cache_bytes (int)        : memory budget of the row cache
+        path (str)               : file the coordinates are read from
+    """
+
+    def __init__(self, location, metric="EUC_2D", cache_bytes=2**26,
+                 path=None):
+        if metric not in METRICS:
+            raise ValueError("metric {} is not supported".format(metric))
+        self.location = np.asarray(location, dtype=np.float64)
+        self.points = self.location.tolist()
+        self.metric = metric
+        super().__init__(len(self.location), cache_bytes, path)
+
+    def _rows(self, key):
+        return self.distance(self.location[key][..., None, :], self.location)
+
+    def item(self, i, j):
+        # Plain floats are much faster than numpy for a single distance
+        (xi, yi), (xj, yj) = self.points[i], self.points[j]
+        dx, dy = xi - xj, yi - yj
+        if self.metric == "ATT":
+            r = math.sqrt((dx * dx + dy * dy) / 10)
+            d = math.floor(r + 0.5)
+            return d + 1 if d < r else d
+        if self.metric == "CEIL_2D":
+            return math.ceil(math.sqrt(dx * dx + dy * dy))
+        return math.floor(math.sqrt(dx * dx + dy * dy) + 0.5)
+
+    def _pairs(self, i, j):
+        if isinstance(i, (int, np.integer)) and isinstance(
+                j, (int, np.integer)):
+            return self.dtype.type(self.item(i, j))
+        return self.distance(self.location[i], self.location[j])
+
+    def symmetric(self):
+        # All metrics are symmetric
+        return True
+
+    def _nearest(self, k):
+        # Rounding keeps the order of the Euclidean distances, so the
+        # Euclidean nearest neighbours are the k nearest neighbours
+        # Euclidean distance. Twice as many candidates are searched, so
+        # locations with the same rounded distance as the k-th neighbour are
+        # among them.
+        rows = np.arange(self.n)
+        m = min(2 * k, self.n - 1)
+        if cKDTree is not None:
+            tree = cKDTree(self.location)
+            nearest = tree.query(self.location, m + 1)[1]
+            other = nearest != rows[:, None]
+            # Without a duplicate location the row itself is among them
+            other[other.all(axis=1), -1] = False
+            nearest = nearest[other].reshape(self.n, m)
+        else:
+            nearest = _grid_neighbours(self.location, m)
+        nearest = np.sort(nearest, axis=1)
+        d = self[rows[:, None], nearest]
+        neighbours = _select_nearest(d, nearest, k)
+
+        # Rows whose candidates are all as near as the k-th neighbour can
+        # have more locations at that distance, they are compared with all
+        if m < self.n - 1:
+            kth = self[rows, neighbours[:, -1]]
+            unsure = np.flatnonzero(d.max(axis=1) <= kth)
+            chunk = max(1, 2**22 // self.n)
+            for start in range(0, len(unsure), chunk):
+                part = unsure[start:start + chunk]
+                d = self._rows(part).astype(np.float64)
+                d[np.arange(len(part)), part] = np.inf
+                neighbours[part] = _select_nearest(
+                    d, np.broadcast_to(rows, d.shape), k)
+        return neighbours
+
+    def distance(self, a, b):
+        """
+        Returns the distances between the coordinates a and b, which are
+        broadcast against each other
+        """
+        dx = a[..., 0] - b[..., 0]
+        dy = a[..., 1] - b[..., 1]
+        if self.metric == "ATT":
+            r = np.sqrt((dx * dx + dy * dy) / 10)
+            d = np.floor(r + 0.5)
+            d = np.where(d < r, d + 1, d)
+        elif self.metric == "CEIL_2D":
+            d = np.ceil(np.sqrt(dx * dx + dy * dy))
+        else:
+            d = np.floor(np.sqrt(dx * dx + dy * dy) + 0.5)
+        return d.astype(self.dtype)
+
+
+def as_distance_provider(dist):
+    """
+    Returns dist as a DistanceProvider: providers are returned as is,
+    memory-mapped arrays become a MemmapDistances and other arrays (or
+    lists of lists) a DenseDistances. Every array gets a single provider
+    while that provider is in use, so all models of an instance share its
+    row cache and neighbour index.
+    """
+    if isinstance(dist, DistanceProvider):
+        return dist
+    if not isinstance(dist, np.ndarray):
+        return DenseDistances(dist)
+    provider = _providers.get(id(dist))
+    if provider is None:
+        if isinstance(dist, np.memmap):
+            provider = MemmapDistances(dist)
+        else:
+            provider = DenseDistances(dist)
+        # Keeps dist alive, so its id is not reused while provider exists
+        provider._source = dist
+        _providers[id(dist)] = provider
+    return provider
+
+
+def neighbour_lists(dist, k):
+    """
+    Returns the k nearest neighbours of every location, nearest first and
+    equally near locations in increasing order
+
+    Parameters:
+        dist (array) : n * n distances, or a DistanceProvider
+        k (int)      : number of neighbours, at most n - 1
+
+    Returns:
+        neighbours (numpy.ndarray) : (n, k) array, neighbours[i] are the k
+                                     locations closest to i
+    """
+    if not hasattr(dist, "shape"):
+        dist = np.asarray(dist)
+    n = len(dist)
+    k = min(k, n - 1)
+    neighbours = np.empty((n, k), dtype=np.intp)
+    locations = np.arange(n)
+    # Rows are processed in chunks to limit the memory use on large n
+    chunk = max(1, 2**22 // n)
+    for start in range(0, n, chunk):
+        rows = np.arange(start, min(start + chunk, n))
+        d = dist[rows].astype(np.float64)
+        d[np.arange(len(rows)), rows] = np.inf
+        neighbours[rows] = _select_nearest(
+            d, np.broadcast_to(locations, d.shape), k)
+    return neighbours
+
+
+def _select_nearest(d, ids, k):
+    """
+    Returns the k ids of every row with the smallest distance d, nearest
+    first and equally near ids in increasing order, also at the k-th
+    position. The ids of every row must be increasing.
+    """
+    kth = np.partition(d, k - 1, axis=1)[:, k - 1, None]
+    nearer = d < kth
+    ties = d == kth
+    # Of the ids as near as the k-th, the lowest that are needed are chosen
+    needed = k - nearer.sum(axis=1, keepdims=True)
+    chosen = nearer | (ties & (np.cumsum(ties, axis=1) <= needed))
+    ids = ids[chosen].reshape(len(d), k)
+    order = np.lexsort((ids, d[chosen].reshape(len(d), k)))
+    return np.take_along_axis(ids, order, axis=1)
+
+
+def _grid_neighbours(location, k):
+    """
+    Returns the k nearest locations of every location by Euclidean
+    distance, in no particular order. The locations are put in a grid of
+    square cells that hold about k locations each, and only the 5 * 5 cells
+    around a location are searched. Locations whose k-th neighbour is
+    further away than the edge of those cells are compared with all
+    locations instead.
+    """
+    n = len(location)
+    x, y = location[:, 0], location[:, 1]
+    width, height = np.ptp(x), np.ptp(y)
+    if width * height > 0:
+        side = np.sqrt(width * height * k / n)
+    else:
+        side = max(width, height) * k / n
+    nearest = np.empty((n, k), dtype=np.intp)
+    missing = np.ones(n, dtype=bool)
+
+    if side > 0:
+        cx = ((x - x.min()) // side).astype(np.intp)
+        cy = ((y - y.min()) // side).astype(np.intp)
+        rows = cy.max() + 1
+        cell = cx * rows + cy
+        order = np.argsort(cell, kind="stable")
+        bounds = np.searchsorted(cell[order],
+                                 np.arange((cx.max() + 1) * rows + 1))
+        limit = (2 * side)**2
+        for c in np.unique(cell).tolist():
+            members = order[bounds[c]:bounds[c + 1]]
+            i, j = divmod(c, rows)
+            candidates = np.concatenate([
+                order[bounds[a * rows + max(j - 2, 0)]:
+                      bounds[a * rows + min(j + 2, rows - 1) + 1]]
+                for a in range(max(i - 2, 0), min(i + 3, cx.max() + 1))
+            ])
+            if len(candidates) <= k:
+                continue
+            dx = x[members, None] - x[candidates]
+            dy = y[members, None] - y[candidates]
+            d = dx * dx + dy * dy
+            d[members[:, None] == candidates] = np.inf
+            best = np.argpartition(d, k - 1, axis=1)[:, :k]
+            found = np.take_along_axis(d, best, axis=1).max(axis=1) <= limit
+            nearest[members[found]] = candidates[best[found]]
+            missing[members[found]] = False
+
+    # Compare the remaining locations with all locations
+    remaining = np.flatnonzero(missing)
+    chunk = max(1, 2**22 // n)
+    for start in range(0, len(remaining), chunk):
+        block = remaining[start:start + chunk]
+        dx = x[block, None] - x
+        dy = y[block, None] - y
+        d = dx * dx + dy * dy
+        d[np.arange(len(block)), block] = np.inf
+        nearest[block] = np.argpartition(d, k - 1, axis=1)[:, :k]
+    return nearest
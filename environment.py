@@ -0,0 +1,125 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from gurobipy import Env, Model
+
+
+class EnvironmentPool:
+    """
+    Gurobi environments shared by all models, so that license handling and
+    logging setup happen once instead of once per Model(). Gurobi
+    environments must not be used by two threads at the same time, so the
+    pool holds one environment per concurrent worker and solve_all never
+    runs two models of the same environment at once.
+
+    Arguments:
+        threads     (int)   : total number of threads of all concurrent
+                              solves, Gurobi's default if None
+        output_flag (bool)  : enable Gurobi logging
+        time_limit  (float) : time limit per solve in seconds
+        workers     (int)   : number of models solve_all solves concurrently,
+                              each gets threads // workers threads
+    """
+
+    def __init__(self, threads=None, output_flag=True, time_limit=None,
+                 workers=1):
+        self.threads = threads
+        self.output_flag = output_flag
+        self.time_limit = time_limit
+        self.workers = workers
+        self.envs = [None] * workers
+        self.created = 0
+
+    def threads_per_model(self):
+        """
+        Returns the thread budget of a single model, 0 is Gurobi's default
+        """
+        if self.threads is None:
+            if self.workers == 1:
+                return 0
+            return max(1, (os.cpu_count() or 1) // self.workers)
+        return max(1, self.threads // self.workers)
+
+    def env(self, index=0):
+        """
+        Returns environment index of the pool, started on first use
+        """
+        if self.envs[index] is None:
+            env = Env(empty=True)
+            env.setParam("OutputFlag", int(self.output_flag))
+            env.setParam("Threads", self.threads_per_model())
+            if self.time_limit is not None:
+                env.setParam("TimeLimit", self.time_limit)
+            env.start()
+            self.envs[index] = env
+        return self.envs[index]
+
+    def model(self, name=""):
+        """
+        Returns a new gurobipy.Model, the environments of the pool are
+        assigned in turn
+        """
+        index = self.created % self.workers
+        self.created += 1
+        model = Model(name, env=self.env(index))
+        model._env_index = index
+        return model
+
+    def solve_all(self, models, **kwargs):
+        """
+        Optimizes models concurrently, models that share an environment are
+        solved one after another by the same worker
+
+        Arguments:
+            models (list) : model objects with .m created by this pool and an
+                            .optimize() method, e.g. DifferentGraph
+            kwargs        : passed on to each .optimize() call
+
+        Returns:
+            models (list) : the optimized models
+        """
+        groups = [[] for i in range(self.workers)]
+        for model in models:
+            groups[model.m._env_index].append(model)
+
+        def solve(group):
+            for model in group:
+                model.optimize(**kwargs)
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            list(executor.map(solve, groups))
+        return models
+
+    def close(self):
+        """
+        Releases the environments of the pool
+        """
+        for env in self.envs:
+            if env is not None:
+                env.dispose()
+        self.envs = [None] * self.workers
+
+
+_default_pool = None
+
+
+def default_pool():
+    """
+    Returns the pool used by models that are not given a pool
+    """
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = EnvironmentPool()
+    return _default_pool
+
+
+def set_default_pool(**kwargs):
+    """
+    Replaces the default pool by EnvironmentPool(**kwargs), e.g.
+    set_default_pool(threads=8, output_flag=False, workers=4)
+    """
+    global _default_pool
+    if _default_pool is not None:
+        _default_pool.close()
+    _default_pool = EnvironmentPool(**kwargs)
+    return _default_pool
@@ -13,10 +13,14 @@ model3.optimize(verbose=False)
 model3.plot("3_NearestNeighbour")
 
 print("\n| Starting Point | ObjVal | \n| -- | -- |")
-for start_city in [2, 16, 17]:
-    model = NearestNeighbour(30, start=start_city)
-    model.optimize(verbose=False)
-    print(f"| {start_city} | {model.objVal} | ")
+model = NearestNeighbour(30)
+start_cities = [2, 16, 17]
+for start_city, objVal in zip(start_cities, model.all_starts(start_cities)):
+    print(f"| {start_city} | {objVal} | ")
+
+# Best tour over all starting points
+model.all_starts()
+print(f"Best starting point: {model.start}, Obj: {model.objVal}")
 
 optimality_gap = 100 * (model3.objVal - 496) / model3.objVal
 print(f"Optimality gap: {round(optimality_gap, 2)}%")
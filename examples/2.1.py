@@ -10,7 +10,7 @@ import pandas as pd
 import visualizer
 from gurobipy import *
 from helper_functions import *
-from models import CVRPModel
+from models import CVRPModel, SavingsHeuristic
 from visualizer import plot, plot_tsp
 
 
@@ -44,18 +44,15 @@ Q = 80
 r = 4
 f = 101
 
-# To hold results, initialize as (list) : list[k] => (ObjValK, xvarsK)
-K_optimals = []
+# One model with 9 vehicles, solved for K = 1..9 vehicles in use, every K
+# starts from the tours of the previous K. Savings heuristic routes as MIP
+# start for K = 1.
+start = SavingsHeuristic(Q, r, 1, f, dist, demand)
+start.optimize()
+model = CVRPModel(Q, r, 9, f, dist, demand)
 
-# Iterate through loop, initialize model
-for K in range(1, 10):
-    model = CVRPModel(Q, r, K, f, dist, demand)
-    model.optimize()
-    K_optimals.append({
-        "K": K,
-        "Obj": model.m.ObjVal,
-        "Tour": model.get_tours()
-    })
+# To hold results, (list) : list[k] => {"K", "Obj", "Tour"}
+K_optimals = model.sweep_fleet(range(1, 10), start.get_tours())
 
 [result["Tour"] for result in K_optimals]
 
@@ -1,38 +1,139 @@
-def parse_tsp_txt(n):
+import os
+from collections import defaultdict
+
+import numpy as np
+from gurobipy import GRB, quicksum
+
+from distances import as_distance_provider
+
+# Characters that separate the numbers in a tsp txt file
+_SEPARATORS = str.maketrans("()[],", "     ")
+
+# Instances loaded in this process, {path: (mtime, location, dist,
+# provider)}, the provider keeps the neighbour index of dist
+_loaded_instances = {}
+
+
+def parse_tsp_txt(n, data_dir="../data", cache=True):
     """
     Parses txt file and returns [location, dist]
 
     Parameters:
-        n (int): tsp problem size, allowed values are 5, 7, 30, 100
+        n (int):        tsp problem size, reads {data_dir}/tsp{n}.txt
+        data_dir (str): directory containing the tsp txt files
+        cache (bool):   use (and create) the binary .npy cache of the file
 
     Returns:
         (location, dist) :
-                location:   list of n (x, y) coordinate tuples
-                dist:       list of n * n distances, with dist[i][j]
+                location:   (n, 2) array of (x, y) coordinates
+                dist:       (n, n) array of distances, with dist[i][j]
                             as the distance from node i t node j
     """
-    if not n == 5 and not n == 7 and not n == 30 and not n == 100:
-        raise ValueError("Invalid n, allowed values are: 5, 7, 30, 100")
-    with open("../data/tsp{}.txt".format(n)) as file:
-        file_content = [l.strip() for l in file.readlines()]
+    return load_tsp(os.path.join(data_dir, "tsp{}.txt".format(n)), cache)
+
+
+def load_tsp(path, cache=True):
+    """
+    Loads a tsp txt file as NumPy arrays. The first load writes the arrays to
+    sidecar files {name}.location.npy and {name}.dist.npy, which are
+    memory-mapped on later loads as long as they are newer than the txt file.
+    Instances are only loaded once per process, and keep a single
+    DistanceProvider (see as_distance_provider) for all models.
+
+    Parameters:
+        path (str):     path of the tsp txt file
+        cache (bool):   use (and create) the binary .npy cache of the file
+
+    Returns:
+        (location, dist) : read-only arrays, see parse_tsp_txt
+    """
+    key = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    if key in _loaded_instances and _loaded_instances[key][0] == mtime:
+        return _loaded_instances[key][1:3]
+
+    base = os.path.splitext(path)[0]
+    cache_files = (base + ".location.npy", base + ".dist.npy")
+    if cache and all(
+            os.path.exists(f) and os.path.getmtime(f) >= mtime
+            for f in cache_files):
+        location, dist = [np.load(f, mmap_mode="r") for f in cache_files]
+    else:
+        location, dist = read_tsp_txt(path)
+        if cache:
+            try:
+                for f, array in zip(cache_files, (location, dist)):
+                    np.save(f, array)
+            except OSError:
+                # Read-only data directory, run without cache
+                pass
+        location.flags.writeable = False
+        dist.flags.writeable = False
+
+    _loaded_instances[key] = (mtime, location, dist,
+                              as_distance_provider(dist))
+    return (location, dist)
+
+
+def read_tsp_txt(path):
+    """
+    Reads a tsp txt file: a header line, n coordinate lines, a header line
+    and n rows of the distance matrix
+
+    Parameters:
+        path (str): path of the tsp txt file
+
+    Returns:
+        (location, dist) : see parse_tsp_txt, integer arrays if all values in
+                           the file are integers
+    """
+    with open(path) as file:
+        file_content = [l.strip() for l in file]
+    while file_content and not file_content[-1]:
+        file_content.pop()
     length = len(file_content)
 
     loc_index = (1, int(length / 2))
     dist_index = (loc_index[1] + 1, length)
+    n = loc_index[1] - loc_index[0]
 
-    location = [eval(l) for l in file_content[loc_index[0]:loc_index[1]]]
-    dist = [eval(l) for l in file_content[dist_index[0]:dist_index[1]]]
-    return (location, dist)
+    location = _parse_numbers(file_content[loc_index[0]:loc_index[1]])
+    dist = _parse_numbers(file_content[dist_index[0]:dist_index[1]])
+    return (location.reshape(n, 2), dist.reshape(n, n))
+
+
+def _parse_numbers(lines):
+    """
+    Returns all numbers in lines as a flat array, as int32 if all are integer
+    """
+    text = " ".join(lines).translate(_SEPARATORS)
+    values = np.array(text.split(), dtype=np.float64)
+    if np.all(values == np.round(values)):
+        return values.astype(np.int32)
+    return values
+
+
+def rotate_tour(tour, start=0):
+    """
+    Returns a closed tour [i, ..., i] rotated to start and end at start
+
+    Parameters:
+        tour (list) : closed tour, tour[0] == tour[-1]
+        start (int) : location to start the tour from
+    """
+    tour = list(tour)
+    index = tour.index(start)
+    return tour[index:-1] + tour[:index] + [start]
 
 
 def get_tours(visits):
     """
     Returns tours[], where each tour is a (sub)tour using the selected visits
     If there are no subtours, tours is a list containing a single (complete)
-    tour
+    tour. The successor of every location is looked up once, so all tours
+    are reconstructed in linear time.
 
     Parameters:
-        xvars (gurobipy.tupledict) : Selected Xij variables of the optimized model
         visits (list)              : List of tuples (i,j) obtained from get_visits
 
     Returns:
@@ -41,42 +142,41 @@ def get_tours(visits):
     """
     n = len(visits)
     is_timespace = len(visits[0]) == 3
+    successor = {visit[0]: visit[1] for visit in visits}
 
     # Timespace tour
     if is_timespace:
-        tour = []
-        visits_dict = dict(zip([v[0] for v in visits], [v[1] for v in visits]))
-        key = 0
-
-        for i in range(n + 1):
-            tour.append(key)
-            key = visits_dict[key]
+        tour = [0]
+        for i in range(n):
+            tour.append(successor[tour[-1]])
         return [tour]
 
     # Non-timespace tour
-    visited = [False] * n
+    visited = set()
     tours = []
-    for i in range(n):
-        if visited[i]:
+    for i in successor:
+        if i in visited:
             continue
         j = i
         new_tour = []
-        while not visited[j]:
-            visited[j] = True
+        while j not in visited:
+            visited.add(j)
             new_tour.append(j)
-            j = visits[j][1]
+            j = successor[j]
         new_tour.append(new_tour[0])
         tours.append(new_tour)
     return tours
 
 
-def get_visits(xvars):
+def get_visits(xvars, model=None, tolerance=0.5):
     """
     Returns xvars as tuples (i,j) where Xij = 1
 
     Parameters:
         xvars (gurobipy.tupledict) : Selected Xij variables of the optimized model
-        timespace (bool)           : Boolean indicating if timespace model
+        model (gurobipy.Model)     : model of xvars, reads all values with a
+                                     single getAttr call if given
+        tolerance (float)          : Xij > tolerance counts as Xij = 1
 
     Returns
         If a timespace model is used:
@@ -84,15 +184,117 @@ def get_visits(xvars):
         If a timespace model is not used:
             visits (list) : List of tuples (i,j) that are selected (Xij = 1)
     """
-    is_timespace = len(list(xvars)[0]) == 3
+    if model is not None:
+        values = model.getAttr("X", list(xvars.values()))
+    else:
+        values = [x.X for x in xvars.values()]
+    visits = [key for key, x in zip(xvars.keys(), values) if x > tolerance]
+
+    is_timespace = len(visits[0]) == 3
     if is_timespace:
-        visits = [var[0] for var in xvars.iteritems() if var[1].X == 1]
         return sorted(visits, key=lambda visit: visit[2])
+    return sorted(visits, key=lambda visit: visit[0])
+
+
+def subtour_elimination(model, where):
+    """
+    Gurobi callback that eliminates subtours with lazy constraints, based on
+    subtourelim in lib/tsp.py. Integer solutions (MIPSOL) get a lazy cut for
+    every subtour, fractional node relaxations (MIPNODE) get a user cut for
+    every disconnected component of their support if model._fractional_cuts
+    is set.
+
+    Expects the model attributes:
+        _xvars (gurobipy.tupledict) : Xij variables of a DifferentGraph, or
+                                      edge variables (i > j) of a
+                                      SymmetricGraph
+        _n (int)                    : number of locations
+        _fractional_cuts (bool)     : also separate fractional solutions
+    """
+    if where == GRB.Callback.MIPSOL:
+        vals = model.cbGetSolution(model._xvars)
+        for S in support_components(vals, model._n, 0.5):
+            if len(S) < model._n:
+                model.cbLazy(subtour_constraint(model._xvars, S))
+    elif (where == GRB.Callback.MIPNODE and model._fractional_cuts
+          and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL):
+        vals = model.cbGetNodeRel(model._xvars)
+        for S in support_components(vals, model._n):
+            if len(S) < model._n:
+                model.cbCut(subtour_constraint(model._xvars, S))
+
+
+def subtour_constraint(xvars, S):
+    """
+    Returns the subtour elimination constraint of node set S: at most
+    |S| - 1 of the arcs (or edges) within S are selected
+
+    Parameters:
+        xvars (gurobipy.tupledict) : Xij variables of the model
+        S (list)                   : nodes of the subtour
+    """
+    return quicksum(xvars[i, j] for i in S for j in S
+                    if (i, j) in xvars) <= len(S) - 1
+
+
+def orient_edges(edges):
+    """
+    Returns the selected undirected edges of a symmetric model as visits
+    (i,j), following every (sub)tour in one direction
 
-    n = max(xvars.keys())[0] + 1
-    visits = []
+    Parameters:
+        edges (list) : tuples (i,j) of the selected edges, each location has
+                       two edges
+
+    Returns:
+        visits (list) : List of tuples (i,j), sorted by i
+    """
+    neighbours = defaultdict(list)
+    for i, j in edges:
+        neighbours[i].append(j)
+        neighbours[j].append(i)
+
+    successor = {}
+    for start in neighbours:
+        if start in successor:
+            continue
+        i, j = start, neighbours[start][0]
+        while j not in successor:
+            successor[i] = j
+            a, b = neighbours[j]
+            i, j = j, (b if a == i else a)
+        successor[i] = j
+    return sorted(successor.items())
+
+
+def support_components(vals, n, eps=1e-6):
+    """
+    Returns the connected components of the arcs (i,j) with a positive value
+
+    Parameters:
+        vals (dict) : {(i, j): value} of a (fractional) solution
+        n (int)     : number of locations
+
+    Returns:
+        components (list) : list of node lists
+    """
+    neighbours = [[] for i in range(n)]
+    for (i, j), x in vals.items():
+        if x > eps:
+            neighbours[i].append(j)
+            neighbours[j].append(i)
+
+    visited = [False] * n
+    components = []
     for i in range(n):
-        for j in range(n):
-            if not i == j and xvars[i, j].X == 1:
-                visits.append((i, j))
-    return sorted(visits, key=lambda visit: visit[0])
+        if visited[i]:
+            continue
+        visited[i] = True
+        component = [i]
+        for j in component:
+            for k in neighbours[j]:
+                if not visited[k]:
+                    visited[k] = True
+                    component.append(k)
+        components.append(component)
+    return components
@@ -1,10 +1,17 @@
-from random import choice
+import time
+from collections import defaultdict, deque, namedtuple
+from heapq import heapify, heappop
+from multiprocessing import Pool
 
 import numpy as np
 import pandas as pd
 from gurobipy import *
 
+from bounds import certified_gap
+from distances import as_distance_provider
+from environment import default_pool
 from helper_functions import *
+from tour import Tour
 from visualizer import plot, plot_tsp
 
 
@@ -21,20 +28,61 @@ class DifferentGraph:
             (9) : No subtours allowed
             (11) : A tour has to start from location 0 (depot)
 
+        tsp_data (tuple) :              (location, dist) of an already loaded
+                                        instance, parsed from file if omitted
+
+        lazy (bool) :                   replace constraints (9) and (11) by
+                                        subtour cuts added as lazy constraints
+                                        during optimization
+        fractional_cuts (bool) :        with lazy, also cut off subtours of
+                                        fractional node relaxations
+        fast_build (bool) :             build the model with bulk calls, the
+                                        build time is kept in .build_time
+        pool (EnvironmentPool) :        Gurobi environments to create the
+                                        model in, the default pool if omitted
+
 
     """
 
-    def __init__(self, n, exclude_constraints=[], verbose=False):
-        tsp_data = parse_tsp_txt(n)
+    def __init__(self, n, exclude_constraints=[], verbose=False,
+                 tsp_data=None, lazy=False, fractional_cuts=False,
+                 fast_build=True, pool=None):
+        build_start = time.perf_counter()
+        tsp_data = tsp_data or parse_tsp_txt(n)
         self.location = tsp_data[0]
         self.dist = tsp_data[1]
-        self.m = Model()
-        self.n = n
+        self.m = (pool or default_pool()).model()
+        self.n = n = len(self.dist)
+        self.lazy = lazy and not 9 in exclude_constraints
         if verbose:
             print('Different Graph model with {} cities'.format(self.n))
             if len(exclude_constraints) > 0:
                 print("Excluded constraints: {}".format(exclude_constraints))
 
+        if self.lazy:
+            exclude_constraints = exclude_constraints + [9, 11]
+        if fast_build:
+            self._build_bulk(exclude_constraints)
+        else:
+            self._build_loops(exclude_constraints)
+
+        if self.lazy:
+            # Subtours are eliminated by subtour_elimination, no u variables
+            self.m._xvars = self.xvars
+            self.m._n = self.n
+            self.m._fractional_cuts = fractional_cuts
+            self.m.Params.LazyConstraints = 1
+        self.update()
+        self.build_time = time.perf_counter() - build_start
+        if verbose:
+            print("Model built in {:.3f}s".format(self.build_time))
+
+    def _build_loops(self, exclude_constraints):
+        """
+        Builds the model variable by variable and constraint by constraint
+        """
+        n = self.n
+
         # Define x variables: xvars[i,j] := visit selected that travels from i to j
         self.xvars = tupledict()
         for i in range(self.n):
@@ -45,7 +93,7 @@ class DifferentGraph:
                                                      name='x[%d,%d]' % (i, j))
 
         # Define u variables: uvars[i] := position of node i in tour
-        self.uvars = [
+        self.uvars = None if self.lazy else [
             self.m.addVar(lb=1, ub=n, vtype=GRB.INTEGER, name='u[%d]' % i)
             for i in range(self.n)
         ]
@@ -72,7 +120,51 @@ class DifferentGraph:
         if not 11 in exclude_constraints:
             # Constraint (11): tour starts from node 0 (i = 0 --> Ui = 1)
             self.m.addConstr(self.uvars[0] == 1)
-        self.update()
+
+    def _build_bulk(self, exclude_constraints):
+        """
+        Builds the same model as _build_loops, with bulk addVars/addConstrs
+        calls and arcs indexed per location instead of wildcard sums
+        """
+        n = self.n
+        I, J = np.nonzero(~np.eye(n, dtype=bool))
+        arcs = list(zip(I.tolist(), J.tolist()))
+
+        # Define x variables: xvars[i,j] := visit selected that travels from i to j
+        self.xvars = self.m.addVars(arcs,
+                                    obj=np.asarray(self.dist)[I, J].tolist(),
+                                    vtype=GRB.BINARY,
+                                    name='x')
+        outgoing = [[] for i in range(n)]
+        ingoing = [[] for i in range(n)]
+        for (i, j), x in self.xvars.items():
+            outgoing[i].append(x)
+            ingoing[j].append(x)
+
+        # Define u variables: uvars[i] := position of node i in tour
+        self.uvars = None if self.lazy else list(
+            self.m.addVars(n, lb=1, ub=n, vtype=GRB.INTEGER,
+                           name='u').values())
+
+        if not 7 in exclude_constraints:
+            # (7) Constraint (7): for each location i: only 1 outgoing visit chosen
+            self.m.addConstrs(quicksum(outgoing[i]) == 1 for i in range(n))
+        if not 8 in exclude_constraints:
+            # Constraint (8): for each location i: #ingoing == #outgoing
+            self.m.addConstrs(
+                quicksum(ingoing[i]) == quicksum(outgoing[i])
+                for i in range(n))
+        if not 9 in exclude_constraints:
+            # Constraint (9): subtour constraints, for all arcs with j != 0
+            M = n - 1
+            u = self.uvars
+            for (i, j), x in self.xvars.items():
+                if not j == 0:
+                    self.m.addLConstr(LinExpr([1, -1, -M], [u[j], u[i], x]),
+                                      GRB.GREATER_EQUAL, 1 - M)
+        if not 11 in exclude_constraints:
+            # Constraint (11): tour starts from node 0 (i = 0 --> Ui = 1)
+            self.m.addConstr(self.uvars[0] == 1)
 
     def update(self):
         """
@@ -87,10 +179,29 @@ class DifferentGraph:
         """
         if not verbose:
             self.m.setParam('OutputFlag', False)
-        self.m.optimize()
-        self.visits = get_visits(self.xvars)
+        if self.lazy:
+            self.m.optimize(subtour_elimination)
+        else:
+            self.m.optimize()
+        self.visits = get_visits(self.xvars, self.m)
         self.tours = get_tours(self.visits)
 
+    def set_start(self, tour):
+        """
+        Sets a tour as MIP start, e.g. the tour of a NearestNeighbour or
+        LateAcceptance heuristic, including the u positions it implies
+
+        Arguments:
+            tour (list) : closed tour [i, ..., i] that visits all locations
+        """
+        tour = rotate_tour(tour)
+        arcs = set(zip(tour[:-1], tour[1:]))
+        self.m.setAttr("Start", list(self.xvars.values()),
+                       [float(arc in arcs) for arc in self.xvars.keys()])
+        if self.uvars is not None:
+            self.m.setAttr("Start", [self.uvars[i] for i in tour[:-1]],
+                           list(range(1, self.n + 1)))
+
     def print_results(self):
         if self.m.Status == 1:
             print("Model not yet optimized, now optimizing")
@@ -101,7 +212,119 @@ class DifferentGraph:
         print("| i | j | dij | ui | ")
         print("| - | - | -- | -- | ")
         for (i, j) in self.visits:
-            print(f"| {i} | {j} | {self.dist[i][j]} | {self.uvars[i].X} |")
+            ui = "-" if self.lazy else self.uvars[i].X
+            print(f"| {i} | {j} | {self.dist[i][j]} | {ui} |")
+
+        print("\nTour(s)")
+        for tour in self.tours:
+            print("-\t {}".format(tour))
+
+    def plot(self, name):
+        """
+		Plots results, optimizes model first if not done yet
+		"""
+        if self.m.Status == 1:
+            print("Model not yet optimized, now optimizing")
+            self.optimize(verbose=True)
+        plot(self.location, self.tours, name)
+
+
+class SymmetricGraph:
+    """
+    An undirected Graph G(V,E) to solve a symmetric TSP problem, with one
+    variable per edge (i,j) with j < i and degree-2 constraints, as in
+    lib/tsp.py. This halves the number of variables of DifferentGraph.
+    Subtours are eliminated by lazy constraints, tours and visits are
+    reported in the same format as DifferentGraph.
+
+    Arguments:
+        n (int) :                       TSP variant, n = 5, 7, 30 or 100
+        tsp_data (tuple) :              (location, dist) of an already loaded
+                                        instance, parsed from file if omitted
+        fractional_cuts (bool) :        also cut off subtours of fractional
+                                        node relaxations
+        pool (EnvironmentPool) :        Gurobi environments to create the
+                                        model in, the default pool if omitted
+
+    """
+
+    def __init__(self, n, verbose=False, tsp_data=None,
+                 fractional_cuts=False, pool=None):
+        build_start = time.perf_counter()
+        tsp_data = tsp_data or parse_tsp_txt(n)
+        self.location = tsp_data[0]
+        self.dist = tsp_data[1]
+        self.n = n = len(self.dist)
+        dist = np.asarray(self.dist)
+        if not np.array_equal(dist, dist.T):
+            raise ValueError("Distances are not symmetric, use DifferentGraph")
+        self.m = (pool or default_pool()).model()
+        if verbose:
+            print('Symmetric Graph model with {} cities'.format(self.n))
+
+        # Define x variables: xvars[i,j] := edge between i and j, j < i
+        I, J = np.tril_indices(n, -1)
+        self.xvars = self.m.addVars(list(zip(I.tolist(), J.tolist())),
+                                    obj=dist[I, J].tolist(),
+                                    vtype=GRB.BINARY,
+                                    name='e')
+        incident = [[] for i in range(n)]
+        for (i, j), x in self.xvars.items():
+            incident[i].append(x)
+            incident[j].append(x)
+
+        # Degree-2 constraint: every location has one ingoing and one
+        # outgoing edge
+        self.m.addConstrs(quicksum(incident[i]) == 2 for i in range(n))
+
+        self.m._xvars = self.xvars
+        self.m._n = self.n
+        self.m._fractional_cuts = fractional_cuts
+        self.m.Params.LazyConstraints = 1
+        self.update()
+        self.build_time = time.perf_counter() - build_start
+        if verbose:
+            print("Model built in {:.3f}s".format(self.build_time))
+
+    def update(self):
+        """
+        Calls gurobi's update function to update model with variables and constraints
+        """
+        self.m.update()
+
+    def optimize(self, verbose=True):
+        """
+        Calls gurobi's optimize function with subtour elimination
+        Calculates visits and tours and assigns these to instance
+        """
+        if not verbose:
+            self.m.setParam('OutputFlag', False)
+        self.m.optimize(subtour_elimination)
+        self.visits = orient_edges(get_visits(self.xvars, self.m))
+        self.tours = get_tours(self.visits)
+
+    def set_start(self, tour):
+        """
+        Sets a tour as MIP start, e.g. the tour of a NearestNeighbour or
+        LateAcceptance heuristic
+
+        Arguments:
+            tour (list) : closed tour [i, ..., i] that visits all locations
+        """
+        edges = set((max(i, j), min(i, j)) for i, j in zip(tour[:-1], tour[1:]))
+        self.m.setAttr("Start", list(self.xvars.values()),
+                       [float(edge in edges) for edge in self.xvars.keys()])
+
+    def print_results(self):
+        if self.m.Status == 1:
+            print("Model not yet optimized, now optimizing")
+            self.optimize(verbose=True)
+        print("\nObj:", self.m.objVal)
+        print("\nx[i,j] = 1 variables:\n\n")
+        print("| i | j | dij | ")
+        print("| - | - | -- | ")
+        for (i, j) in self.visits:
+            print(f"| {i} | {j} | {self.dist[i][j]} |")
 
         print("\nTour(s)")
         for tour in self.tours:
@@ -117,30 +340,88 @@ class DifferentGraph:
         plot(self.location, self.tours, name)
 
 
+def tsp_model(n, tsp_data=None, **kwargs):
+    """
+    Returns a SymmetricGraph if the distances of the instance are symmetric,
+    otherwise a DifferentGraph with lazy subtour elimination
+
+    Arguments:
+        n (int) :          TSP variant, n = 5, 7, 30 or 100
+        tsp_data (tuple) : (location, dist) of an already loaded instance,
+                           parsed from file if omitted
+        kwargs :           passed on to the model constructor
+    """
+    tsp_data = tsp_data or parse_tsp_txt(n)
+    dist = np.asarray(tsp_data[1])
+    if np.array_equal(dist, dist.T):
+        return SymmetricGraph(n, tsp_data=tsp_data, **kwargs)
+    return DifferentGraph(n, tsp_data=tsp_data, lazy=True, **kwargs)
+
+
 class TimeSpaceNetwork:
-    def __init__(self, n, verbose=True):
+    def __init__(self, n, verbose=True, tsp_data=None, fast_build=True,
+                 pool=None, candidates=None, tour=None):
         """
 		Intializes a Time-Space Network (class 4)
 
 		Arguments:
 			n:                  number of locations
+			tsp_data (tuple):   (location, dist) of an already loaded
+			                    instance, parsed from file if omitted
+			fast_build (bool):  build the model with bulk calls, the build
+			                    time is kept in .build_time
+			pool (EnvironmentPool): Gurobi environments to create the model
+			                    in, the default pool if omitted
+			candidates (int):   only create the arcs between each location
+			                    and its k = candidates nearest neighbours
+			                    (and the arcs of tour), optimize adds the
+			                    missing arcs that are needed by pricing
+			tour (list):        closed tour whose arcs are always created
+			                    with candidates, and used as MIP start, the
+			                    NearestNeighbour tour if omitted
 
 		Attributes:
 			location (list):     (x,y) coordinates parsed from .txt file
 			dist (list):         (i,j) distance from i to j
 			m (gurobipy.Model):  gurobi model used for optimization
 			xvars:               decision variables
+			build_time (float):  seconds spent building the model
 		"""
-        tsp_data = parse_tsp_txt(n)
+        build_start = time.perf_counter()
+        tsp_data = tsp_data or parse_tsp_txt(n)
         self.location = tsp_data[0]
         self.dist = tsp_data[1]
-        self.n = n
-        self.m = Model()
-        self.xvars = tupledict()
+        self.n = n = len(self.dist)
+        self.m = (pool or default_pool()).model()
 
         if verbose:
             print('Time Space Network model with {} cities'.format(self.n))
 
+        self.candidates = candidates
+        if candidates is not None:
+            if tour is None:
+                heuristic = NearestNeighbour(n, tsp_data=tsp_data)
+                heuristic.optimize()
+                tour = heuristic.tour
+            self._build_bulk(self._candidate_arcs(candidates, tour))
+            self.set_start(tour)
+        elif fast_build:
+            self._build_bulk(self._all_arcs())
+        else:
+            self._build_loops()
+
+        self.update()
+        self.build_time = time.perf_counter() - build_start
+        if verbose:
+            print("Model built in {:.3f}s".format(self.build_time))
+
+    def _build_loops(self):
+        """
+		Builds the model variable by variable and constraint by constraint
+		"""
+        n = self.n
+        self.xvars = tupledict()
+
         # (1) Define X0,j,0 variables: start from node 0
         for j in range(1, n):
             self.xvars[0, j, 0] = self.m.addVar(obj=self.dist[0][j],
@@ -180,7 +461,75 @@ class TimeSpaceNetwork:
             self.m.addConstr(self.xvars.sum("*", j, "*") == 1)
         # (5) Constraint: Xij is binary already defined in (1)
 
-        self.update()
+    def _all_arcs(self):
+        """
+		Returns the keys (i,j,t) of all arcs of the time-space network, in the
+		order of _build_loops
+		"""
+        n = self.n
+        keys = [(0, j, 0) for j in range(1, n)]
+        keys += [(i, 0, n - 1) for i in range(1, n)]
+        keys += [(i, j, t) for i in range(1, n) for j in range(1, n) if i != j
+                 for t in range(1, n - 1)]
+        return keys
+
+    def _candidate_arcs(self, k, tour):
+        """
+		Returns the keys (i,j,t) of the depot arcs and of the arcs between
+		each location and its k nearest neighbours or its tour neighbours,
+		for every step t
+		"""
+        n = self.n
+        pairs = set(zip(tour[:-1], tour[1:]))
+        index = as_distance_provider(self.dist).neighbours(k)
+        for i, neighbours in enumerate(index):
+            pairs.update((i, j) for j in neighbours.tolist())
+        pairs.update([(j, i) for (i, j) in pairs])
+        keys = [(0, j, 0) for j in range(1, n)]
+        keys += [(i, 0, n - 1) for i in range(1, n)]
+        keys += [(i, j, t) for (i, j) in sorted(pairs) if i and j
+                 for t in range(1, n - 1)]
+        return keys
+
+    def _build_bulk(self, keys):
+        """
+		Builds the same model as _build_loops, with a single addVars call and
+		arcs indexed per (location, step) instead of wildcard sums. Only the
+		arcs in keys are created.
+		"""
+        n = self.n
+        arcs = np.array(keys).reshape(-1, 3)
+
+        # (1) Define all Xijt variables
+        self.xvars = self.m.addVars(
+            keys,
+            obj=np.asarray(self.dist)[arcs[:, 0], arcs[:, 1]].tolist(),
+            vtype=GRB.BINARY,
+            name='x')
+        outgoing = defaultdict(list)
+        ingoing = defaultdict(list)
+        visits = defaultdict(list)
+        for (i, j, t), x in self.xvars.items():
+            outgoing[i, t].append(x)
+            ingoing[j, t].append(x)
+            visits[j].append(x)
+
+        # (2) Constraint: Start from depot 0 on first step
+        self.start_constr = self.m.addConstr(
+            quicksum(outgoing[0, 0]) == 1, "x[0,j]=1")
+
+        # (3) Constraint: Ingoing Xji = Outgoing Xij
+        self.flow_constrs = tupledict()
+        for i in range(n):
+            for t in range(n - 1):
+                self.flow_constrs[i, t] = self.m.addConstr(
+                    quicksum(ingoing[i, t]) == quicksum(outgoing[i, t + 1]),
+                    name=f"x[j,{i},{t}]=x[{i},j,{t}]")
+
+        # (4) Constraint: Only 1 ingoing arc for node 1 to n-1
+        self.visit_constrs = self.m.addConstrs(
+            quicksum(visits[j]) == 1 for j in range(1, n - 1))
+        # (5) Constraint: Xij is binary already defined in (1)
 
     def update(self):
         """
@@ -190,14 +539,123 @@ class TimeSpaceNetwork:
 
     def optimize(self, verbose=True):
         """
-		Calls gurobi's optimize function, and calculates visits and tours
+		Calls gurobi's optimize function, and calculates visits and tours.
+		With candidate arcs, arcs are priced in first (see price_arcs) and
+		afterwards every missing arc that could still improve the solution is
+		added, so the result is optimal for the full network.
+
+		The number of arcs (NumVars) of the candidate model, after pricing
+		and at the end are kept in .num_vars, with the size of the full
+		network. The LP bound of the time-space network is weak, so on small
+		instances the reduced cost test can add back most of the network
+		and the candidates save little.
 		"""
         if not verbose:
             self.m.setParam('OutputFlag', False)
-        self.m.optimize()
-        self.visits = get_visits(self.xvars)
+        if self.candidates is None:
+            self.m.optimize()
+        else:
+            self.num_vars = {"candidates": self.m.NumVars}
+            self.pricing_rounds = 0
+            while self.price_arcs() > 0:
+                self.pricing_rounds += 1
+            self.num_vars["priced"] = self.m.NumVars
+            self.m.optimize()
+            if self.m.SolCount > 0:
+                incumbent = self.m.getVars()
+                start = self.m.getAttr("X", incumbent)
+                if self.price_arcs(self.m.ObjVal) > 0:
+                    # Re-solve with the arcs that pass the reduced cost
+                    # test, starting from the incumbent
+                    self.m.setAttr("Start", incumbent, start)
+                    self.m.optimize()
+            self.num_vars["final"] = self.m.NumVars
+            self.num_vars["full"] = 2 * (self.n - 1) + (self.n - 1) * (
+                self.n - 2)**2
+            if verbose:
+                print("Arcs: {candidates} candidates, {priced} after pricing,"
+                      " {final} of {full} after the reduced cost test".format(
+                          **self.num_vars))
+        self.visits = get_visits(self.xvars, self.m)
         self.tours = get_tours(self.visits)
 
+    def price_arcs(self, incumbent=None):
+        """
+		Solves the LP relaxation of the current model and adds the missing
+		arcs with a negative reduced cost. Given the objective value of an
+		incumbent, instead adds every missing arc whose reduced cost does not
+		rule it out of a better solution: LP bound + reduced cost < incumbent.
+		This is valid once no arc has a negative reduced cost.
+
+		Arguments:
+			incumbent (float):  objective value of a known solution
+
+		Returns:
+			added (int): number of arcs added
+		"""
+        n = self.n
+        relaxation = self.m.relax()
+        relaxation.setParam('OutputFlag', False)
+        relaxation.optimize()
+        pi = np.array(relaxation.getAttr("Pi", relaxation.getConstrs()))
+        bound = relaxation.ObjVal
+        relaxation.dispose()
+
+        flow = np.zeros((n, n))
+        for (i, t), constr in self.flow_constrs.items():
+            flow[i, t] = pi[constr.index]
+        visit = np.zeros(n)
+        for j, constr in self.visit_constrs.items():
+            visit[j] = pi[constr.index]
+
+        # Inner arcs (i,j) of every step t that are in the model already
+        present = defaultdict(list)
+        for (i, j, t) in self.xvars.keys():
+            if i and j:
+                present[t].append((i, j))
+
+        # Arcs are priced one step t at a time, with n * n arrays
+        dist = np.asarray(self.dist, dtype=np.float64)
+        added = 0
+        for t in range(1, n - 1):
+            reduced_cost = (dist + flow[:, t - 1, None] -
+                            (flow[:, t] + visit)[None, :])
+            reduced_cost[0, :] = reduced_cost[:, 0] = np.inf
+            np.fill_diagonal(reduced_cost, np.inf)
+            if present[t]:
+                reduced_cost[tuple(np.array(present[t]).T)] = np.inf
+            if incumbent is None:
+                add = reduced_cost < -1e-6
+            else:
+                add = bound + reduced_cost < incumbent - 1e-6
+
+            for i, j in zip(*[a.tolist() for a in np.nonzero(add)]):
+                column = Column([1, -1], [self.flow_constrs[j, t],
+                                          self.flow_constrs[i, t - 1]])
+                if j < n - 1:
+                    column.addTerms(1, self.visit_constrs[j])
+                self.xvars[i, j, t] = self.m.addVar(
+                    obj=self.dist[i][j],
+                    vtype=GRB.BINARY,
+                    name='x[%d,%d,%d]' % (i, j, t),
+                    column=column)
+            added += int(add.sum())
+        self.update()
+        return added
+
+    def set_start(self, tour):
+        """
+		Sets a tour as MIP start, the i-th step of the tour from the depot is
+		used as time index t of its arc
+
+		Arguments:
+			tour (list): closed tour [i, ..., i] that visits all locations
+		"""
+        tour = rotate_tour(tour)
+        arcs = set(zip(tour[:-1], tour[1:], range(self.n)))
+        self.m.setAttr("Start", list(self.xvars.values()),
+                       [float(arc in arcs) for arc in self.xvars.keys()])
+
     def save(self, filename):
         """
 		Saves model as file to /models/{filename}
@@ -236,78 +694,140 @@ class TimeSpaceNetwork:
         plot_tsp(self.location, self.tours[0], name)
 
 
-class NearestNeighbour:
+class DynamicProgramming:
     """
-    Initialize a Nearest Neighbour Heuristic
+    Solves a TSP exactly with the Held-Karp dynamic program over subsets of
+    locations, without Gurobi. Time and memory grow with 2^n * n, so it is
+    meant for instances up to about n = 20, e.g. tsp5, tsp7 or the routes of
+    single vehicles.
 
     Arguments:
         n (int) :                       TSP variant, n = 5, 7, 30 or 100
+        tsp_data (tuple) :              (location, dist) of an already loaded
+                                        instance, parsed from file if omitted
 
     """
 
-    def __init__(self, n, verbose=False, start=0):
-        tsp_data = parse_tsp_txt(n)
+    def __init__(self, n, verbose=False, tsp_data=None):
+        tsp_data = tsp_data or parse_tsp_txt(n)
         self.location = tsp_data[0]
         self.dist = tsp_data[1]
-        self.start = start
-        self.n = n
+        self.n = len(self.dist)
+        self.visits = []
 
         if verbose:
-            print('NearestNeighbour Heuristic with {} cities'.format(self.n))
+            print('Dynamic Programming with {} cities'.format(self.n))
 
-    def nearest_node(self, i, dj):
+    def optimize(self, verbose=False):
         """
-        Retrieves nearest node from i to dj
+        Fills cost[S, j], the length of the shortest path that starts at
+        location 0, visits set S of the other locations and ends at j in S,
+        one subset size at a time, and reconstructs the optimal tour
+        """
+        d = np.asarray(self.dist, dtype=np.float64)
+        m = self.n - 1
+        if m == 0:
+            self.tour = [0, 0]
+            self.objVal = 0
+            self._finish(verbose)
+            return
+
+        # Bit j of a subset is location j + 1
+        subsets = np.arange(1 << m)
+        size = np.zeros(1 << m, dtype=np.int64)
+        for j in range(m):
+            size += (subsets >> j) & 1
+        cost = np.full((1 << m, m), np.inf)
+        parent = np.zeros((1 << m, m), dtype=np.int8 if m < 128 else np.int16)
+        cost[1 << np.arange(m), np.arange(m)] = d[0, 1:]
+
+        for k in range(2, m + 1):
+            layer = subsets[size == k]
+            for j in range(m):
+                S = layer[(layer >> j) & 1 == 1]
+                paths = cost[S ^ (1 << j)] + d[1:, j + 1]
+                parent[S, j] = np.argmin(paths, axis=1)
+                cost[S, j] = paths[np.arange(len(S)), parent[S, j]]
+
+        S = (1 << m) - 1
+        j = int(np.argmin(cost[S] + d[1:, 0]))
+        self.objVal = (cost[S, j] + d[j + 1, 0]).item()
+        tour = [0]
+        for _ in range(m):
+            tour.append(j + 1)
+            S, j = S ^ (1 << j), int(parent[S, j])
+        tour.append(0)
+        self.tour = tour[::-1]
+        self._finish(verbose)
+
+    def _finish(self, verbose):
+        """
+        Sets the visits and tours of the optimal tour
+        """
+        if np.all(np.asarray(self.dist) == np.round(self.dist)):
+            self.objVal = int(round(self.objVal))
+        self.visits = sorted(zip(self.tour[:-1], self.tour[1:]))
+        self.tours = [self.tour]
+        if verbose:
+            self.print_results()
 
-        Arguments:
-            i (int)     : origin or source point
-            dj (list)   : distances from i to j
+    def print_results(self):
+        if not len(self.visits) == self.n:
+            print("Model not yet optimized, now optimizing")
+            self.optimize()
+        print("\nObj:", self.objVal)
+        print("\nx[i,j] = 1 variables:")
+        print("| i | j | dij | ")
+        print("| - | -| -- | ")
+        for (i, j) in self.visits:
+            print(f"| {i} | {j} | {self.dist[i][j]} | ")
+        print("\nTour(s)")
+        for tour in self.tours:
+            print("-\t {}".format(tour))
 
-        Returns:
-            node (int) : index of nearest node
+    def plot(self, name):
         """
-        options = [(j, d) for (j, d) in enumerate(dj)
-                   if not i == j and j not in self.tour]
-        return min(options, key=lambda option: option[1])[0]
+		Plots results, optimizes model first if not done yet
+		"""
+        if not len(self.visits) == self.n:
+            print("Model not yet optimized, now optimizing")
+            self.optimize()
+        plot(self.location, self.tours, name)
+
+
+class TourHeuristic:
+    """
+    Methods shared by the heuristics that build or improve a single tour.
+    Subclasses set .n, .location, .dist (a DistanceProvider) and .tour, a
+    closed tour [0, ..., 0], and implement optimize().
+    """
 
     def calc_obj_val(self):
         """
         Returns the current objective value from its visits
         """
-        self.visits = []
-        for i in self.tour[:-1]:
-            self.visits.append((self.tour[i], self.tour[i + 1]))
-        self.objVal = sum([self.dist[i][j] for (i, j) in self.visits])
+        tour = np.asarray(self.tour)
+        self.visits = list(zip(self.tour[:-1], self.tour[1:]))
+        self.objVal = self.dist[tour[:-1], tour[1:]].sum().item()
         return self.objVal
 
-    def optimize(self, verbose=False):
+    def gap(self):
         """
-        Visit a nearest node until the tour has visited all points
+        Returns the optimality gap (%) of the tour, certified by the Held-Karp
+        lower bound instead of an LP relaxation
         """
-        self.tour = [self.start]
-        while len(self.tour) < self.n:
-            i = self.tour[-1]
-            dj = self.dist[i]
-            dest = self.nearest_node(i, dj)
-            self.tour.append(dest)
-        self.tour.append(self.start)
-
-        self.calc_obj_val()
-        if verbose:
-            self.print_results()
+        return certified_gap(self.objVal, self.dist)
 
     def print_results(self):
-        if not len(self.visits) == self.n:
+        if not len(getattr(self, "visits", [])) == self.n:
             print("Model not yet optimized, now optimizing")
-            self.optimize(verbose=True)
+            self.optimize()
         print("\nObj:", self.objVal)
-        # Sort visits Xij's by i, if not already done
-
         print("\nx[i,j] = 1 variables:")
         print("| i | j | dij | ")
         print("| - | -| -- | ")
         for (i, j) in self.visits:
-            print(f"| {i} | {j} | {self.dist[i][j]} | ")
+            print(f"| {i} | {j} | {self.dist[i, j]} | ")
         print("\nTour")
         print(f"{self.tour}")
 
@@ -315,131 +835,654 @@ class NearestNeighbour:
         """
 		Plots results, optimizes model first if not done yet
 		"""
-        if not len(self.visits) == self.n:
+        if not len(getattr(self, "visits", [])) == self.n:
             print("Model not yet optimized, now optimizing")
-            self.optimize(verbose=True)
+            self.optimize()
         plot(self.location, [self.tour], name)
 
 
-class LateAcceptance:
+class NearestNeighbour(TourHeuristic):
     """
-    Late Acceptance Heuristic for TSP problems
+    Initialize a Nearest Neighbour Heuristic
 
     Arguments:
-        n            (int)  : TSP variant, n = 5, 7, 30 or 100
-        L            (int)  : number of candidates to consider per step
-        limit_idle   (bool) : use limit of 1000 steps without improvements,
-                              incase limit_idle is not set, use 10,000 steps
-                              without considering if a step causes an
-                              improvement or not
-        verbose      (bool) : enable verbose logging
-        random_start (bool) : start the Heuristic with a random solution
+        n (int) :                       TSP variant, n = 5, 7, 30 or 100
+        tsp_data (tuple) :              (location, dist) of an already loaded
+                                        instance, parsed from file if omitted
+        k (int) :                       size of the neighbour lists that are
+                                        searched before a full distance row
 
     """
 
-    def __init__(self, n, L, limit_idle=True, verbose=True,
-                 random_start=False):
-        tsp_data = parse_tsp_txt(n)
+    def __init__(self, n, verbose=False, start=0, tsp_data=None, k=10):
+        tsp_data = tsp_data or parse_tsp_txt(n)
         self.location = tsp_data[0]
-        self.dist = tsp_data[1]
-        self.limit_idle = limit_idle
-        self.n = n
-        self.L = L
-        self.visits = []
-        self.s = [i for i in range(self.n)]
-        if random_start:
-            self.s = self.candidate_solution()
-        self.C = self.calc_obj_val(self.s)
-        self.f = [self.C] * (L)
-        self.I = 0
-        self.I_idle = 0
+        self.dist = as_distance_provider(tsp_data[1])
+        self.start = start
+        self.n = len(self.dist)
+        self.k = k
 
         if verbose:
             print('NearestNeighbour Heuristic with {} cities'.format(self.n))
 
-    def random_start_results(self, rand_number, L=None, n=None):
+    def nearest_node(self, i, visited):
         """
-		Runs the Late Heuristic model multiple times with random starts
-
-		Arguments:
-			L (int) :           parameter of Late Heuristic Model
-			n (int) :           tsp dataset to run on
-			rand_number (int) : number of random models (random starts)
-		Returns:
-			results (list): objective results for each random model start
-		"""
-        results = []
-        if L == None:
-            L = self.L
-        if n == None:
-            n = self.n
-        for i in range(rand_number):
-            self.__init__(n, L, random_start=True, verbose=False)
-            self.optimize()
-            results.append(self.ObjVal)
-
-        return results
+        Retrieves nearest unvisited node from i
 
-    def calc_obj_val(self, s):
-        self.visits = []
-        for i in range(len(s) - 1):
-            self.visits.append((s[i], s[i + 1]))
-        return sum([self.dist[i][j] for (i, j) in self.visits])
+        Arguments:
+            i (int)                 : origin or source point
+            visited (numpy.ndarray) : boolean mask of the visited nodes
 
-    def candidate_solution(self):
-        """
-        Generates a random candidate solution, using simple insert/remove
+        Returns:
+            node (int) : index of nearest node
         """
-        new_tour = self.s[1:-1]
-        r_remove = choice(new_tour)
-        r_insert = choice(new_tour)
-        new_tour.remove(r_remove)
-        new_tour.insert(r_insert, r_remove)
-        return [0] + new_tour + [0]
+        neighbours = self.neighbours[i]
+        for j in neighbours.tolist():
+            if not visited[j]:
+                # Locations as near as the last neighbour can be missing
+                if self.dist.item(i, j) < self.dist.item(i, neighbours[-1]):
+                    return j
+                break
+        return int(np.argmin(np.where(visited, np.inf, self.dist[i])))
 
     def optimize(self, verbose=False):
         """
-        Optimizes model, with a limit of 1,000 idle steps or 10,000 steps
+        Visit a nearest node until the tour has visited all points
         """
-        if self.limit_idle:
-            while not (self.I_idle > 1000):
-                self.step()
-        else:
-            while not (self.I > 10000):
-                self.step()
-        self.ObjVal = self.C
+        self.neighbours = self.dist.neighbours(self.k)
+        visited = np.zeros(self.n, dtype=bool)
+        visited[self.start] = True
+        self.tour = [self.start]
+        while len(self.tour) < self.n:
+            dest = self.nearest_node(self.tour[-1], visited)
+            visited[dest] = True
+            self.tour.append(dest)
+        self.tour.append(self.start)
+
+        self.calc_obj_val()
         if verbose:
             self.print_results()
 
-    def step(self):
+    def all_starts(self, starts=None, batch_size=None):
         """
-        Calculate candidate_solution according to the Late Acceptance Heuristic.
+        Builds the nearest neighbour tour from every start node at once, the
+        tours of a batch of starts are extended together with a masked argmin.
+        Afterwards the model holds the best tour found.
+
+        Arguments:
+            starts (list)    : start nodes to use, all nodes if omitted
+            batch_size (int) : number of starts built together, limits the
+                               memory use to about batch_size * n values
+
+        Returns:
+            objVals (numpy.ndarray) : objective value of the tour from each
+                                      start node in starts
+        """
+        dist = self.dist
+        starts = np.arange(self.n) if starts is None else np.asarray(starts)
+        if batch_size is None:
+            batch_size = max(1, 2**22 // self.n)
+
+        # Tour lengths of int32 or float32 distances overflow or lose
+        # precision, they are summed in 64 bits
+        total = np.result_type(dist.dtype, np.int64)
+        objVals = np.empty(len(starts), dtype=total)
+        best_tour = None
+        for b in range(0, len(starts), batch_size):
+            batch = starts[b:b + batch_size]
+            rows = np.arange(len(batch))
+            tours = np.empty((len(batch), self.n + 1), dtype=np.intp)
+            tours[:, 0] = tours[:, -1] = batch
+            visited = np.zeros((len(batch), self.n), dtype=bool)
+            visited[rows, batch] = True
+            for step in range(1, self.n):
+                dj = np.where(visited, np.inf, dist[tours[:, step - 1]])
+                tours[:, step] = np.argmin(dj, axis=1)
+                visited[rows, tours[:, step]] = True
+            costs = dist[tours[:, :-1], tours[:, 1:]].sum(axis=1, dtype=total)
+            objVals[b:b + len(batch)] = costs
+            if best_tour is None or costs.min() < best_obj:
+                best_obj = costs.min()
+                best_tour = tours[np.argmin(costs)]
+
+        self.start = int(best_tour[0])
+        self.tour = best_tour.tolist()
+        self.calc_obj_val()
+        return objVals
+
+
+class SpaceFillingCurve(TourHeuristic):
+    """
+    Builds a tour that visits the locations in the order of a Hilbert curve
+    through the plane, in O(n log n). Locations that are close on the curve
+    are close in the plane, so the tour is a fast start for large instances.
+
+    Arguments:
+        n (int) :                       TSP variant, n = 5, 7, 30 or 100
+        tsp_data (tuple) :              (location, dist) of an already loaded
+                                        instance, parsed from file if omitted
+        order (int) :                   the curve passes through a grid of
+                                        2**order * 2**order cells
+
+    """
+
+    def __init__(self, n, verbose=False, tsp_data=None, order=16):
+        tsp_data = tsp_data or parse_tsp_txt(n)
+        self.location = tsp_data[0]
+        self.dist = as_distance_provider(tsp_data[1])
+        self.n = len(self.dist)
+        self.order = order
+        self.visits = []
+        if self.location is None:
+            raise ValueError("SpaceFillingCurve needs the locations")
+
+        if verbose:
+            print('SpaceFillingCurve Heuristic with {} cities'.format(self.n))
+
+    def curve_index(self):
+        """
+        Returns the position of every location on the Hilbert curve
+        """
+        location = np.asarray(self.location, dtype=np.float64)
+        low = location.min(axis=0)
+        scale = (2**self.order - 1) / max(np.ptp(location, axis=0).max(), 1)
+        x, y = ((location - low) * scale).astype(np.int64).T
+        index = np.zeros(self.n, dtype=np.int64)
+        s = 2**(self.order - 1)
+        while s > 0:
+            rx = (x & s) > 0
+            ry = (y & s) > 0
+            index += s * s * ((3 * rx) ^ ry)
+            # Rotate the quadrant, so the curve continues in the next one
+            flip = ~ry & rx
+            x = np.where(flip, s - 1 - x, x)
+            y = np.where(flip, s - 1 - y, y)
+            x, y = np.where(ry, x, y), np.where(ry, y, x)
+            s //= 2
+        return index
+
+    def optimize(self, verbose=False):
+        """
+        Visits the locations in the order of the curve
+        """
+        order = np.argsort(self.curve_index(), kind="stable").tolist()
+        self.tour = rotate_tour(order + order[:1])
+        self.calc_obj_val()
+        if verbose:
+            self.print_results()
+
+
+class GreedyEdge(TourHeuristic):
+    """
+    Greedy Edge Heuristic: adds the shortest edges first, skipping edges
+    that give a location a third edge or close a subtour. Only the edges to
+    the k nearest neighbours are considered, taken from a heap, and the
+    remaining paths are joined nearest endpoint first.
+
+    Arguments:
+        n (int) :                       TSP variant, n = 5, 7, 30 or 100
+        tsp_data (tuple) :              (location, dist) of an already loaded
+                                        instance, parsed from file if omitted
+        k (int) :                       number of nearest neighbours per
+                                        location
+
+    """
+
+    def __init__(self, n, verbose=False, tsp_data=None, k=10):
+        tsp_data = tsp_data or parse_tsp_txt(n)
+        self.location = tsp_data[0]
+        self.dist = as_distance_provider(tsp_data[1])
+        self.n = len(self.dist)
+        self.k = k
+        self.visits = []
+
+        if verbose:
+            print('GreedyEdge Heuristic with {} cities'.format(self.n))
+
+    def find(self, i):
+        """
+        Returns the representative of the path containing location i
+        """
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def link(self, i, j):
+        self.adjacent[i].append(j)
+        self.adjacent[j].append(i)
+
+    def optimize(self, verbose=False):
+        """
+        Adds the candidate edges shortest first, then joins the paths
+        """
+        n = self.n
+        self.parent = list(range(n))
+        self.adjacent = [[] for i in range(n)]
+        neighbours = self.dist.neighbours(self.k)
+        rows = np.repeat(np.arange(n), neighbours.shape[1])
+        columns = neighbours.ravel()
+        # Every candidate edge (i, j) once, with i < j
+        keys = np.unique(np.minimum(rows, columns) * n +
+                         np.maximum(rows, columns))
+        rows, columns = np.divmod(keys, n)
+        costs = self.dist[rows, columns]
+        edges = list(zip(costs.tolist(), rows.tolist(), columns.tolist()))
+        heapify(edges)
+
+        added = 0
+        while edges and added < n - 1:
+            _, i, j = heappop(edges)
+            if len(self.adjacent[i]) == 2 or len(self.adjacent[j]) == 2:
+                continue
+            a, b = self.find(i), self.find(j)
+            if a == b:
+                continue
+            self.parent[a] = b
+            self.link(i, j)
+            added += 1
+
+        self.join_paths()
+        tour = [0]
+        previous, i = 0, self.adjacent[0][0]
+        while i != 0:
+            tour.append(i)
+            a, b = self.adjacent[i]
+            previous, i = i, (b if a == previous else a)
+        self.tour = tour + [0]
+
+        self.calc_obj_val()
+        if verbose:
+            self.print_results()
+
+    def join_paths(self):
+        """
+        Joins the paths into a tour: from the end of the current path, the
+        nearest end of another path is visited next
+        """
+        adjacent = self.adjacent
+        ends = [i for i in range(self.n) if len(adjacent[i]) < 2]
+        other_end = {}
+        for i in ends:
+            if i in other_end:
+                continue
+            j = i
+            if adjacent[i]:
+                previous, j = i, adjacent[i][0]
+                while len(adjacent[j]) == 2:
+                    a, b = adjacent[j]
+                    previous, j = j, (b if a == previous else a)
+            other_end[i], other_end[j] = j, i
+
+        ends = np.array(ends, dtype=np.intp)
+        free = np.ones(self.n, dtype=bool)
+        first = int(ends[0])
+        current = other_end[first]
+        free[[first, current]] = False
+        for _ in range(len(ends)):
+            candidates = ends[free[ends]]
+            if len(candidates) == 0:
+                break
+            j = int(candidates[np.argmin(self.dist[current, candidates])])
+            self.link(current, j)
+            current = other_end[j]
+            free[[j, current]] = False
+        self.link(current, first)
+
+
+class LocalSearch(TourHeuristic):
+    """
+    Improves a tour with 2-opt and Or-opt moves. Only moves that connect a
+    location to one of its k nearest neighbours are evaluated, and a
+    location is only evaluated again (don't-look bit) after one of its tour
+    edges has changed. The gains of reversed segments assume symmetric
+    distances, asymmetric distances raise a ValueError.
+
+    Arguments:
+        n (int) :                       TSP variant, n = 5, 7, 30 or 100
+        tour (list) :                   closed tour to improve, e.g. from a
+                                        heuristic or a MIP incumbent, the
+                                        NearestNeighbour tour if omitted
+        k (int) :                       number of nearest neighbours per
+                                        location
+        segment_length (int) :          longest segment moved by Or-opt
+        tsp_data (tuple) :              (location, dist) of an already loaded
+                                        instance, parsed from file if omitted
+
+    """
+
+    def __init__(self, n, tour=None, k=10, segment_length=3, verbose=False,
+                 tsp_data=None):
+        tsp_data = tsp_data or parse_tsp_txt(n)
+        self.location = tsp_data[0]
+        self.dist = as_distance_provider(tsp_data[1])
+        if not self.dist.symmetric():
+            raise ValueError("Distances are not symmetric, LocalSearch "
+                             "only supports symmetric distances")
+        self.n = len(self.dist)
+        self.segment_length = segment_length
+        self.neighbours = self.dist.neighbours(k).tolist()
+        if tour is None:
+            start = NearestNeighbour(self.n,
+                                     tsp_data=(self.location, self.dist))
+            start.optimize()
+            tour = start.tour
+        self.tour = list(tour)
+
+        if verbose:
+            print('LocalSearch Heuristic with {} cities'.format(self.n))
+
+    def optimize(self, verbose=False):
+        """
+        Applies improving moves until no location can be improved
+        """
+        self.route = Tour(self.tour)
+
+        queue = deque(self.route.order)
+        self.queued = [True] * self.n
+        self.queue = queue
+        self.moves = 0
+        while queue:
+            i = queue.popleft()
+            self.queued[i] = False
+            if self.improve_two_opt(i) or self.improve_or_opt(i):
+                self.moves += 1
+
+        self.tour = self.route.to_list(start=0)
+        self.calc_obj_val()
+        if verbose:
+            self.print_results()
+
+    def wake(self, *nodes):
+        """
+        Clears the don't-look bits of nodes
+        """
+        for i in nodes:
+            if not self.queued[i]:
+                self.queued[i] = True
+                self.queue.append(i)
+
+    def improve_two_opt(self, a):
+        """
+        Applies the first improving 2-opt move that replaces a tour edge of a
+        by an edge from a to one of its neighbours
+
+        Returns:
+            improved (bool) : whether a move was applied
+        """
+        d = self.dist.item
+        succ, pred = self.route.succ, self.route.pred
+        for forward in (True, False):
+            b = succ(a) if forward else pred(a)
+            d_ab = d(a, b)
+            for c in self.neighbours[a]:
+                d_ac = d(a, c)
+                if d_ac >= d_ab:
+                    break
+                e = succ(c) if forward else pred(c)
+                if c == b or e == a:
+                    continue
+                if d_ac + d(b, e) < d_ab + d(c, e):
+                    # Replace (a,b),(c,e) by (a,c),(b,e)
+                    pos = self.route.pos
+                    if forward:
+                        self.route.reverse(pos[b], pos[c])
+                    else:
+                        self.route.reverse(pos[a], pos[e])
+                    self.wake(a, b, c, e)
+                    return True
+        return False
+
+    def improve_or_opt(self, a):
+        """
+        Applies the first improving Or-opt move that moves a segment starting
+        at a next to a neighbour of one of the segment ends
+
+        Returns:
+            improved (bool) : whether a move was applied
+        """
+        d = self.dist.item
+        n = self.n
+        succ, pred = self.route.succ, self.route.pred
+        for length in range(1, min(self.segment_length, n - 3) + 1):
+            i = self.route.position(a)
+            segment = [self.route[i + t] for t in range(length)]
+            first, last = segment[0], segment[-1]
+            before, after = pred(first), succ(last)
+            gain = d(before, first) + d(last, after) - d(before, after)
+
+            # (x, forward): insert the segment between x and succ(x)
+            options = []
+            for c in self.neighbours[first]:
+                if d(c, first) >= gain:
+                    break
+                options += [(c, True), (pred(c), False)]
+            for c in self.neighbours[last]:
+                if d(c, last) >= gain:
+                    break
+                options += [(c, False), (pred(c), True)]
+
+            for x, forward in options:
+                if x in segment or x == before:
+                    continue
+                y = succ(x)
+                if forward:
+                    added = d(x, first) + d(last, y) - d(x, y)
+                else:
+                    added = d(x, last) + d(first, y) - d(x, y)
+                if added < gain:
+                    self.route.move_segment(i, length, x, forward)
+                    self.wake(before, after, x, y, first, last)
+                    return True
+        return False
+
+
+class LateAcceptance:
+    """
+    Late Acceptance Heuristic for TSP problems
+
+    Arguments:
+        n            (int)  : TSP variant, n = 5, 7, 30 or 100
+        L            (int)  : number of candidates to consider per step
+        limit_idle   (bool) : use limit of 1000 steps without improvements,
+                              incase limit_idle is not set, use 10,000 steps
+                              without considering if a step causes an
+                              improvement or not
+        verbose      (bool) : enable verbose logging
+        random_start (bool) : start the Heuristic with a random solution
+        tsp_data     (tuple): (location, dist) of an already loaded instance,
+                              parsed from file if omitted
+        seed         (int)  : seed of the random number generator, runs with
+                              the same seed give identical results
+        block_size   (int)  : number of random moves drawn at once
+
+    """
+
+    def __init__(self, n, L, limit_idle=True, verbose=True,
+                 random_start=False, tsp_data=None, seed=None,
+                 block_size=2**14):
+        tsp_data = tsp_data or parse_tsp_txt(n)
+        self.location = tsp_data[0]
+        self.dist = as_distance_provider(tsp_data[1])
+        self.limit_idle = limit_idle
+        self.n = len(self.dist)
+        self.L = L
+        self.rng = np.random.default_rng(seed)
+        self.block_size = block_size
+        self.move_block = iter(())
+        self.visits = []
+        self.s = list(range(self.n))
+        if random_start:
+            self.s = self.candidate_solution()
+        self.C = self.calc_obj_val(self.s)
+        self.f = [self.C] * (L)
+        self.I = 0
+        self.I_idle = 0
+
+        if verbose:
+            print('NearestNeighbour Heuristic with {} cities'.format(self.n))
+
+    def random_start_results(self, rand_number, L=None, n=None,
+                             processes=1, seed=None):
+        """
+		Runs the Late Heuristic model multiple times with random starts, in
+		parallel with multi_start. The full result is kept in
+		.multi_start_result
+
+		Arguments:
+			L (int) :           parameter of Late Heuristic Model
+			n (int) :           tsp dataset to run on
+			rand_number (int) : number of random models (random starts)
+			processes (int) :   number of worker processes, all cores if None,
+			                    1 (default) runs in this process, so scripts
+			                    need no __main__ guard
+			seed (int) :        seed of the random starts
+		Returns:
+			results (list): objective results for each random model start
+		"""
+        if L == None:
+            L = self.L
+        if n == None:
+            n = self.n
+        tsp_data = (self.location, self.dist) if n == self.n else None
+        self.multi_start_result = multi_start(n, L, rand_number,
+                                              limit_idle=self.limit_idle,
+                                              processes=processes,
+                                              seed=seed,
+                                              tsp_data=tsp_data)
+        return self.multi_start_result.objectives
+
+    @property
+    def s(self):
+        """
+        Current solution as a closed tour [0, ..., 0], built from the
+        array-backed self.tour_array that the moves are applied to
+        """
+        return self.tour_array.to_list()
+
+    @s.setter
+    def s(self, tour):
+        self.tour_array = Tour(tour)
+
+    def calc_obj_val(self, s):
+        self.visits = list(zip(s[:-1], s[1:]))
+        return self.dist[s[:-1], s[1:]].sum().item()
+
+    def candidate_solution(self):
+        """
+        Generates a random candidate solution, using simple insert/remove
+        """
+        p, q = self.candidate_move()
+        new_tour = Tour(self.tour_array.order)
+        new_tour.move(p, q)
+        return new_tour.to_list()
+
+    def candidate_move(self):
+        """
+        Returns the next random insert/remove move, moves are drawn from
+        self.rng in blocks of block_size
+
+        Returns:
+            (p, q) : the node at position p of self.s is removed and inserted
+                     again at position q of the remaining tour
+        """
+        move = next(self.move_block, None)
+        if move is None:
+            self.move_block = self.draw_moves()
+            move = next(self.move_block)
+        return move
+
+    def draw_moves(self):
+        """
+        Returns an iterator over block_size random moves (p, q)
+        """
+        p, q = self.rng.integers(1, self.n, (2, self.block_size)).tolist()
+        return zip(p, q)
+
+    def move_delta(self, p, q):
+        """
+        Returns the change in objective value of move (p, q), only the (at
+        most six) edges that are affected by the move are evaluated
+
+        Arguments:
+            p (int) : position of the node to remove, 1 <= p <= n - 1
+            q (int) : position to insert the node at, 1 <= q <= n - 1
+        """
+        if p == q:
+            return 0
+        s = self.tour_array.order
+        d = self.dist.item
+        node, before = s[p], s[p - 1]
+        # s[n] is location 0 again, which is stored at position 0
+        after = s[p + 1] if p + 1 < self.n else 0
+        # Position k of the tour after removing s[p]
+        a = s[q - 1] if q - 1 < p else s[q]
+        if q < p:
+            b = s[q]
+        else:
+            b = s[q + 1] if q + 1 < self.n else 0
+        return (d(before, after) - d(before, node) - d(node, after) +
+                d(a, node) + d(node, b) - d(a, b))
+
+    def apply_move(self, p, q):
+        """
+        Applies move (p, q) in place on the current solution self.s
+        """
+        self.tour_array.move(p, q)
+
+    def optimize(self, verbose=False):
+        """
+        Optimizes model, with a limit of 1,000 idle steps or 10,000 steps
+        """
+        if self.limit_idle:
+            while not (self.I_idle > 1000):
+                self.step()
+        else:
+            while not (self.I > 10000):
+                self.step()
+        self.C = self.calc_obj_val(self.s)
+        self.ObjVal = self.C
+        if verbose:
+            self.print_results()
+
+    def step(self):
+        """
+        Evaluate a candidate move according to the Late Acceptance Heuristic.
         The idle counter is increased/reset depending on if the
-        candidate_solution is lower than the current solution.
-        Afterwards, define index v := i mod L and see if the candidate_solution
-        can be accepted if it is less than then f[v]
+        candidate is lower than the current solution.
+        Afterwards, define index v := i mod L and see if the candidate
+        can be accepted if it is less than then f[v], only accepted moves
+        are applied to the current solution
         """
-        s_candidate = self.candidate_solution()
-        C_candidate = self.calc_obj_val(s_candidate)
+        p, q = self.candidate_move()
+        C_candidate = self.C + self.move_delta(p, q)
         if C_candidate >= self.C:
             self.I_idle += 1
         if C_candidate < self.C:
             self.I_idle = 0
         v = self.I % self.L
         if C_candidate < self.f[v] or C_candidate <= self.C:
-            self.s = s_candidate
-            self.C = self.calc_obj_val(self.s)
+            self.apply_move(p, q)
+            self.C = C_candidate
         if self.C < self.f[v]:
             self.f[v] = self.C
         self.I += 1
 
+    def gap(self):
+        """
+        Returns the optimality gap (%) of the tour, certified by the Held-Karp
+        lower bound instead of an LP relaxation
+        """
+        return certified_gap(self.C, self.dist)
+
     def print_results(self):
         print("\nObj:", self.C)
         print("\nx[i,j] = 1 variables:")
         print("| i | j | dij | ")
         print("| - | -| -- | ")
         for (i, j) in self.visits:
-            print(f"| {i} | {j} | {self.dist[i][j]} | ")
+            print(f"| {i} | {j} | {self.dist[i, j]} | ")
         print("\nTour")
         print(f"{self.s}")
 
@@ -450,13 +1493,223 @@ class LateAcceptance:
         if not len(self.visits) == self.n:
             print("Model not yet optimized, now optimizing")
             self.optimize(verbose=True)
-        plot(self.location, [self.tour], name)
+        plot(self.location, [self.s], name)
+
+
+class BatchLateAcceptance:
+    """
+    Late Acceptance Heuristic that advances B chains in lockstep. The tours,
+    objective values and late acceptance lists f of all chains are stored as
+    arrays, and every step draws, evaluates and accepts/rejects one
+    insert/remove move for all chains at once.
+
+    Arguments:
+        n            (int)  : TSP variant, n = 5, 7, 30 or 100
+        L            (int)  : number of candidates to consider per step
+        B            (int)  : number of chains
+        limit_idle   (bool) : a chain stops after 1000 steps without
+                              improvements, incase limit_idle is not set, all
+                              chains run 10,000 steps
+        random_start (bool) : start every chain from a random solution
+        seed         (int)  : seed of the random number generator
+        tsp_data     (tuple): (location, dist) of an already loaded instance,
+                              parsed from file if omitted
+
+    Attributes:
+        s               (numpy.ndarray) : (B, n + 1) tours of the chains
+        C               (numpy.ndarray) : (B,) objective values of the chains
+        f               (numpy.ndarray) : (B, L) late acceptance lists
+        trajectory_mean (list)          : mean objective value after each step
+        trajectory_min  (list)          : lowest objective value after each
+                                          step
+    """
+
+    def __init__(self, n, L, B, limit_idle=True, random_start=True,
+                 seed=None, tsp_data=None):
+        tsp_data = tsp_data or parse_tsp_txt(n)
+        self.location = tsp_data[0]
+        self.dist = as_distance_provider(tsp_data[1])
+        self.n = len(self.dist)
+        self.L = L
+        self.B = B
+        self.limit_idle = limit_idle
+        self.rng = np.random.default_rng(seed)
+        self.rows = np.arange(B)
+
+        self.s = np.zeros((B, self.n + 1), dtype=np.intp)
+        self.s[:, 1:-1] = np.arange(1, self.n)
+        if random_start:
+            self.s[:, 1:-1] = self.rng.permuted(self.s[:, 1:-1], axis=1)
+        self.C = self.dist[self.s[:, :-1], self.s[:, 1:]].sum(axis=1)
+        self.f = np.repeat(self.C[:, None], L, axis=1)
+        self.I = 0
+        self.I_idle = np.zeros(B, dtype=int)
+        self.trajectory_mean = []
+        self.trajectory_min = []
+
+    def active(self):
+        """
+        Returns a boolean mask of the chains that have not stopped yet
+        """
+        if self.limit_idle:
+            return self.I_idle <= 1000
+        return np.full(self.B, self.I <= 10000)
+
+    def step(self):
+        """
+        Performs a Late Acceptance step (see LateAcceptance.step) for all
+        active chains. Moves are evaluated from the six affected edges and
+        the accepted ones are applied with a single gather.
+        """
+        rows, s, d, n = self.rows, self.s, self.dist, self.n
+        p = self.rng.integers(1, n, self.B)
+        q = self.rng.integers(1, n, self.B)
+
+        # Edges removed and added by the moves, see LateAcceptance.move_delta
+        node, before, after = s[rows, p], s[rows, p - 1], s[rows, p + 1]
+        a = np.where(q - 1 < p, s[rows, q - 1], s[rows, q])
+        b = np.where(q < p, s[rows, q], s[rows, q + 1])
+        C_candidate = self.C + (d[before, after] - d[before, node] -
+                                d[node, after] + d[a, node] + d[node, b] -
+                                d[a, b])
+
+        active = self.active()
+        self.I_idle[active] = np.where(C_candidate >= self.C, self.I_idle + 1,
+                                       0)[active]
+        v = self.I % self.L
+        accept = active & ((C_candidate < self.f[:, v]) |
+                           (C_candidate <= self.C))
+        if accept.any():
+            p, q = p[accept, None], q[accept, None]
+            k = np.arange(n + 1)[None, :]
+            # Positions from p to q shift one place towards p, q gets node p
+            shift = np.where(p < q, 1, -1)
+            index = np.where((k >= np.minimum(p, q)) & (k <= np.maximum(p, q)),
+                             k + shift, k)
+            index = np.where(k == q, p, index)
+            s[accept] = np.take_along_axis(s[accept], index, axis=1)
+            self.C = np.where(accept, C_candidate, self.C)
+
+        self.f[:, v] = np.where(active & (self.C < self.f[:, v]), self.C,
+                                self.f[:, v])
+        self.I += 1
+        self.trajectory_mean.append(self.C.mean())
+        self.trajectory_min.append(self.C.min())
+
+    def optimize(self, verbose=False):
+        """
+        Steps until all chains have stopped, with a limit of 1,000 idle steps
+        per chain or 10,000 steps
+        """
+        while self.active().any():
+            self.step()
+        self.ObjVal = self.C.min()
+        if verbose:
+            self.print_results()
+
+    def best_tour(self):
+        """
+        Returns the tour of the chain with the lowest objective value
+        """
+        return self.s[np.argmin(self.C)].tolist()
+
+    def print_results(self):
+        print("\nObj per chain:", self.C.tolist())
+        print("\nBest Obj:", self.C.min())
+        print("\nBest Tour")
+        print(f"{self.best_tour()}")
+
+    def plot(self, name):
+        """
+		Plots the best tour
+		"""
+        plot(self.location, [self.best_tour()], name)
+
+
+MultiStartResult = namedtuple(
+    "MultiStartResult",
+    ["best_tour", "best_obj", "objectives", "tours", "times", "seeds"])
+
+# Instance shared by the multi_start worker processes
+_worker_tsp_data = None
+
+
+def _init_worker(tsp_data):
+    global _worker_tsp_data
+    _worker_tsp_data = tsp_data
+
+
+def _late_acceptance_run(args):
+    """
+    Runs a single random start of LateAcceptance on the shared instance
+    """
+    L, limit_idle, run_seed = args
+    start_time = time.perf_counter()
+    model = LateAcceptance(len(_worker_tsp_data[1]), L,
+                           limit_idle=limit_idle,
+                           verbose=False,
+                           random_start=True,
+                           tsp_data=_worker_tsp_data,
+                           seed=run_seed)
+    model.optimize()
+    return (model.s, model.ObjVal, time.perf_counter() - start_time)
+
+
+def multi_start(n, L, runs, limit_idle=True, processes=None, seed=None,
+                tsp_data=None):
+    """
+    Runs independent random starts of the Late Acceptance Heuristic in a
+    process pool. The instance is sent to each worker once, and every run
+    gets its own seed, so results do not depend on the number of processes.
+
+    Arguments:
+        n          (int)   : TSP variant, n = 5, 7, 30 or 100
+        L          (int)   : parameter of Late Heuristic Model
+        runs       (int)   : number of random starts
+        limit_idle (bool)  : see LateAcceptance
+        processes  (int)   : number of worker processes, all cores if None,
+                             1 runs all starts in this process
+        seed       (int)   : seed the run seeds are derived from
+        tsp_data   (tuple) : (location, dist) of an already loaded instance,
+                             parsed from file if omitted
+
+    Returns:
+        result (MultiStartResult) :
+            best_tour  (list) : best tour found
+            best_obj   (int)  : objective value of best_tour
+            objectives (list) : objective value of each run
+            tours      (list) : final tour of each run
+            times      (list) : seconds spent on each run
+            seeds      (list) : seed of each run
+    """
+    tsp_data = tsp_data or parse_tsp_txt(n)
+    seeds = np.random.SeedSequence(seed).generate_state(runs).tolist()
+    tasks = [(L, limit_idle, run_seed) for run_seed in seeds]
+    if processes == 1:
+        _init_worker(tsp_data)
+        results = [_late_acceptance_run(task) for task in tasks]
+    else:
+        with Pool(processes, _init_worker, (tsp_data, )) as pool:
+            results = pool.map(_late_acceptance_run, tasks)
+
+    tours, objectives, times = [list(r) for r in zip(*results)]
+    best = int(np.argmin(objectives))
+    return MultiStartResult(tours[best], objectives[best], objectives, tours,
+                            times, seeds)
 
 
 class CVRPModel:
     """
     Initializes a Vehicle Routing Problem Model with Capacity constraints:
 
+    Two formulations are available. "three-index" has a variable Xijk for
+    every vehicle k, with symmetry_breaking the vehicles are ordered by their
+    lowest customer ("index") or by load ("load"), so each solution appears
+    once instead of K! times. "two-index" aggregates the identical vehicles
+    into one variable Xij per arc with K arcs leaving the depot, the load
+    of the vehicle after each customer (lifted MTZ constraints) excludes
+    subtours and overloaded routes, so the model size does not grow with K.
+
     Arguments:
         Q       (int)   : capacity constraint of vehicles
         r       (int)   : profit per demand
@@ -465,19 +1718,63 @@ class CVRPModel:
         dist    (list)  : 2D map of n * n customer, where dist[i][j] represents
                           the distance from node i to j
         demand  (list)  : list of demands, where d[0] = 0 (source depot)
+        pool    (EnvironmentPool) : Gurobi environments to create the model
+                          in, the default pool if omitted
+        formulation (str) : "three-index" or "two-index"
+        symmetry_breaking (str) : "index", "load" or None, how the vehicles
+                          of the three-index formulation are ordered
     """
 
-    def __init__(self, Q, r, K, f, dist, demand):
-        self.m = Model()
+    def __init__(self, Q, r, K, f, dist, demand, pool=None,
+                 formulation="three-index", symmetry_breaking="index"):
+        if formulation not in ("three-index", "two-index"):
+            raise ValueError("Unknown formulation {}".format(formulation))
+        if symmetry_breaking not in ("index", "load", None):
+            raise ValueError(
+                "Unknown symmetry breaking {}".format(symmetry_breaking))
+        self.m = (pool or default_pool()).model()
         self.n = len(dist)
         self.K = K
         self.dist = dist
         self.demand = demand
         self.Q = Q
         self.r = r
+        self.f = f
+        # Vehicles in the model, set_fleet can use fewer of them
+        self.K_max = K
+        self.formulation = formulation
+        self.symmetry_breaking = symmetry_breaking
+
+        if formulation == "two-index":
+            self.add_two_index()
+        else:
+            self.add_three_index()
 
         # (1) Objective Function:
 
+        # (1) Transportation costs: sum all binary Xij * Dij
+        self.transport_costs = quicksum(
+            self.dist[key[0]][key[1]] * x for key, x in self.xvars.items())
+
+        # (1) Fixed fee, every vehicle costs f, so f*K is total vehicle cost
+        self.fixed_costs = K * f
+
+        # (1) Revenue of r per demand j for each j visited.
+        # Simply sum all variables as we will handle restrictions later on in the constraints
+        self.revenue = quicksum(
+            self.demand[key[1]] * self.r * x for key, x in self.xvars.items())
+
+        self.m.setObjective(
+            (self.revenue - self.transport_costs - self.fixed_costs),
+            GRB.MAXIMIZE)
+
+    def add_three_index(self):
+        """
+        Adds the variables Xijk (vehicle k from i to j) and Ujk, and the
+        constraints of the three-index formulation
+        """
+        K = self.K
+
         # (1) Initialize 3-parameter binary values Xijk: vehicle k from i to j
         self.xvars = tupledict()
         for i in range(self.n):
@@ -499,26 +1796,6 @@ class CVRPModel:
                                                  name=f"u[{j}][{k}]")
         self.m.update()
 
-        # (1) Transportation costs: sum all binary Xij * Dij
-        self.transport_costs = sum([
-            self.dist[i][j] * self.xvars.sum(i, j, "*") for i in range(self.n)
-            for j in range(self.n)
-        ])
-
-        # (1) Fixed fee, every vehicle costs f, so f*K is total vehicle cost
-        self.fixed_costs = K * f
-
-        # (1) Revenue of r per demand j for each j visited.
-        # Simply sum all variables as we will handle restrictions later on in the constraints
-        self.revenue = sum([
-            self.demand[j] * self.r * self.xvars.sum("*", j, "*")
-            for j in range(self.n)
-        ])
-
-        self.m.setObjective(
-            (self.revenue - self.transport_costs - self.fixed_costs),
-            GRB.MAXIMIZE)
-
         # (2) Constraint: Only visit each place once
         for j in range(1, self.n):
             self.m.addConstr(self.xvars.sum("*", j, "*") <= 1)
@@ -530,11 +1807,11 @@ class CVRPModel:
         for k in range(K):
             # (4) Constraint: each vehicle can visit a place at most once
             for j in range(self.n):
-                self.m.addConstr(self.xvars.sum("*", j, self.K) <= 1)
+                self.m.addConstr(self.xvars.sum("*", j, k) <= 1)
 
             # (5) Constraint: each vehicle can leave a place at most once
             for i in range(self.n):
-                self.m.addConstr(self.xvars.sum(i, "*", self.K) <= 1)
+                self.m.addConstr(self.xvars.sum(i, "*", k) <= 1)
 
         # (6) If vehicle k visits i, it should also leave i
         for k in range(K):
@@ -552,25 +1829,243 @@ class CVRPModel:
                         M * (1 - self.xvars.sum(i, j, "*")))
 
         # (8) Capacity constraints: each vehicle carries at most Q
+        loads = [
+            quicksum(self.xvars.sum("*", j, k) * self.demand[j]
+                     for j in range(1, self.n)) for k in range(K)
+        ]
         for k in range(K):
-            self.m.addConstr(
-                sum([
-                    self.xvars.sum("*", j, k) * self.demand[j]
-                    for j in range(self.n)
-                ]) <= self.Q)
+            self.m.addConstr(loads[k] <= self.Q)
 
         # (9) Each vehicle leaves the depot
-        for k in range(K):
+        self.fleet_constrs = [
             self.m.addConstr(self.xvars.sum(0, "*", k) == 1)
+            for k in range(K)
+        ]
+
+        # (10) Symmetry breaking: vehicle k carries at least vehicle k+1
+        if self.symmetry_breaking == "load":
+            for k in range(K - 1):
+                self.m.addConstr(loads[k] >= loads[k + 1])
+
+        # (10) Symmetry breaking: the lowest customer of vehicle k is lower
+        # than the lowest customer of vehicle k+1
+        if self.symmetry_breaking == "index":
+            for k in range(1, K):
+                for j in range(1, self.n):
+                    self.m.addConstr(
+                        self.xvars.sum("*", j, k) <= quicksum(
+                            self.xvars.sum("*", i, k - 1)
+                            for i in range(1, j)))
+
+    def add_two_index(self):
+        """
+        Adds the variables Xij (a vehicle from i to j) and Lj (load of the
+        vehicle after visiting customer j), and the constraints of the
+        two-index formulation
+        """
+        # (1) Initialize 2-parameter binary values Xij: a vehicle from i to j
+        self.xvars = tupledict()
+        for i in range(self.n):
+            for j in range(self.n):
+                if not i == j:
+                    self.xvars[i, j] = self.m.addVar(vtype=GRB.BINARY,
+                                                     name=f"x[{i}][{j}]")
+
+        # (1) Initialize 1-parameter continuous variables Lj: load delivered
+        # by the vehicle of customer j up to and including j
+        self.uvars = tupledict()
+        for j in range(1, self.n):
+            self.uvars[j] = self.m.addVar(lb=min(self.demand[j], self.Q),
+                                          ub=self.Q,
+                                          name=f"l[{j}]")
+        self.m.update()
+
+        # (2) Constraint: Only visit each place once
+        for j in range(1, self.n):
+            self.m.addConstr(self.xvars.sum("*", j) <= 1)
+
+        # (3) If a vehicle visits j, it should also leave j
+        for j in range(1, self.n):
+            self.m.addConstr(self.xvars.sum("*", j) == self.xvars.sum(j, "*"))
+
+        # (4) K vehicles leave the depot and return to it
+        self.fleet_constrs = [
+            self.m.addConstr(self.xvars.sum(0, "*") == self.K),
+            self.m.addConstr(self.xvars.sum("*", 0) == self.K)
+        ]
+
+        # (5) Subtour and capacity constraints: the load increases by the
+        # demand of every customer on the route (lifted MTZ)
+        Q = self.Q
+        for i in range(1, self.n):
+            for j in range(1, self.n):
+                if not i == j:
+                    self.m.addConstr(
+                        self.uvars[j] >= self.uvars[i] + self.demand[j] -
+                        Q * (1 - self.xvars[i, j]) +
+                        (Q - self.demand[i] - self.demand[j]) *
+                        self.xvars[j, i])
+
+        # (6) Bounds on the load: it includes the demand of the previous
+        # customer and leaves room for the demand of the next customer
+        for j in range(1, self.n):
+            self.m.addConstr(self.uvars[j] >= self.demand[j] + quicksum(
+                self.demand[i] * self.xvars[i, j] for i in range(1, self.n)
+                if not i == j))
+            self.m.addConstr(self.uvars[j] <= Q - quicksum(
+                self.demand[i] * self.xvars[j, i] for i in range(1, self.n)
+                if not i == j))
+
+        # (7) Capacity cut: the K vehicles carry at most K * Q together
+        self.capacity_constr = self.m.addConstr(
+            quicksum(self.demand[j] * self.xvars.sum("*", j)
+                     for j in range(1, self.n)) <= self.K * Q)
+
+        # (8) Customers that exceed the capacity are not visited
+        for j in range(1, self.n):
+            if self.demand[j] > Q:
+                self.m.addConstr(self.xvars.sum("*", j) == 0)
 
     def optimize(self):
         """
         Calls gurobi's optimize function on the linear program and updates
-        the .ObjVal of the instance .ObjVal to the result
+        the .ObjVal of the instance .ObjVal to the result, the successor of
+        every location per vehicle is read in a single pass
 
         """
         self.m.optimize()
         self.ObjVal = self.m.ObjVal
+        self.successors = [dict() for k in range(self.K)]
+        if self.formulation == "two-index":
+            # Vehicle k follows the k-th arc that leaves the depot
+            arcs = dict()
+            for (i, j) in get_visits(self.xvars, self.m):
+                arcs.setdefault(i, []).append(j)
+            for k, j in enumerate(arcs.get(0, [])):
+                self.successors[k][0] = j
+                while j != 0:
+                    self.successors[k][j] = arcs[j][0]
+                    j = arcs[j][0]
+            return
+        for (i, j, k) in get_visits(self.xvars, self.m):
+            self.successors[k][i] = j
+
+    def set_start(self, tours):
+        """
+        Sets the tours of the vehicles as MIP start, e.g. from a heuristic
+
+        Arguments:
+            tours (list) : tours[k] is the tour [0, ..., 0] of vehicle k, as
+                           returned by get_tours
+        """
+        if self.formulation == "two-index":
+            arcs = set()
+            loads = {}
+            for tour in tours:
+                arcs.update(zip(tour[:-1], tour[1:]))
+                load = 0
+                for j in tour[1:-1]:
+                    load += self.demand[j]
+                    loads[j] = load
+            self.m.setAttr("Start", list(self.xvars.values()),
+                           [float(arc in arcs) for arc in self.xvars.keys()])
+            self.m.setAttr("Start", list(self.uvars.values()), [
+                loads.get(j, self.uvars[j].LB) for j in self.uvars.keys()
+            ])
+            return
+        # Order the vehicles as required by constraint (10)
+        if self.symmetry_breaking == "load":
+            tours = sorted(tours,
+                           key=lambda tour: -sum(self.demand[j] for j in tour))
+        elif self.symmetry_breaking == "index":
+            tours = sorted(tours, key=lambda tour: min(tour[1:-1] or [0]))
+        arcs = set()
+        positions = {}
+        for k, tour in enumerate(tours):
+            arcs.update((i, j, k) for (i, j) in zip(tour[:-1], tour[1:]))
+            positions.update(((j, k), u) for u, j in enumerate(tour[:-1]))
+        self.m.setAttr("Start", list(self.xvars.values()),
+                       [float(arc in arcs) for arc in self.xvars.keys()])
+        self.m.setAttr("Start", list(self.uvars.values()),
+                       [positions.get(key, 0) for key in self.uvars.keys()])
+
+    def set_fleet(self, K):
+        """
+        Uses the first K of the K_max vehicles the model was built with, the
+        others are fixed to zero by their bounds, so the model is not built
+        again. Updates the fixed costs to K * f.
+
+        Arguments:
+            K (int) : number of vehicles to use, at most K_max
+        """
+        if not 1 <= K <= self.K_max:
+            raise ValueError("K must be between 1 and {}".format(self.K_max))
+        if self.formulation == "two-index":
+            for constr in self.fleet_constrs:
+                constr.RHS = K
+            self.capacity_constr.RHS = K * self.Q
+        else:
+            for k in range(self.K_max):
+                used = float(k < K)
+                self.fleet_constrs[k].RHS = used
+                arcs = self.xvars.select("*", "*", k)
+                self.m.setAttr("UB", arcs, [used] * len(arcs))
+        self.K = K
+        self.fixed_costs = K * self.f
+        self.m.ObjCon = -self.fixed_costs
+
+    def sweep_fleet(self, K_values, tours=None):
+        """
+        Solves the model for every number of vehicles in K_values with
+        set_fleet. Every solve starts from the tours of the previous one:
+        the least profitable tours are dropped, or vehicles are added for
+        the most profitable customers that are not visited (or the last
+        customer of the longest tour).
+
+        Arguments:
+            K_values (list) : numbers of vehicles, each at most K_max
+            tours    (list) : tours to start the first solve from, e.g.
+                              SavingsHeuristic.get_tours()
+
+        Returns:
+            results (list) : {"K": K, "Obj": profit, "Tour": tours} for every
+                             K, in the order of K_values
+        """
+        results = []
+        for K in K_values:
+            self.set_fleet(K)
+            if tours is not None:
+                self.set_start(self.fleet_start(tours, K))
+            self.optimize()
+            tours = self.get_tours()
+            results.append({"K": K, "Obj": self.ObjVal, "Tour": tours})
+        return results
+
+    def fleet_start(self, tours, K):
+        """
+        Returns K tours made from tours, see sweep_fleet
+        """
+        def profit(tour):
+            return (self.r * sum(self.demand[j] for j in tour) -
+                    sum(self.dist[i][j] for i, j in zip(tour[:-1], tour[1:])))
+
+        tours = sorted((list(tour) for tour in tours if len(tour) > 2),
+                       key=profit,
+                       reverse=True)[:K]
+        visited = {j for tour in tours for j in tour}
+        spare = sorted((j for j in range(1, self.n)
+                        if j not in visited and self.demand[j] <= self.Q),
+                       key=lambda j: profit([0, j, 0]))
+        while len(tours) < K:
+            if spare:
+                j = spare.pop()
+            else:
+                longest = max(tours, key=len)
+                if len(longest) <= 3:
+                    break
+                j = longest.pop(-2)
+            tours.append([0, j, 0])
+        return tours
 
     def get_vehicle_tour(self, k):
         """
@@ -583,18 +2078,13 @@ class CVRPModel:
             tour (list) : list of locations visited, starting and ending in
                           location 0 (depot)
         """
-
-        visits = get_visits(self.xvars)
-        vehicle_visits = [(visit[0], visit[1]) for visit in visits
-                          if visit[2] == k]
-        tour = []
-        key = 0
-        while len(vehicle_visits) > 0:
-            visit = [arc for arc in vehicle_visits if arc[0] == key][0]
-            key = visit[1]
-            tour.append(visit[1])
-            vehicle_visits.remove(visit)
-        return [0] + tour
+        tour = [0]
+        successors = self.successors[k]
+        while tour[-1] in successors:
+            tour.append(successors[tour[-1]])
+            if tour[-1] == 0:
+                break
+        return tour
 
     def get_tours(self):
         """
@@ -605,3 +2095,429 @@ class CVRPModel:
                           vehicle k
         """
         return [self.get_vehicle_tour(k) for k in range(self.K)]
+
+
+class SavingsHeuristic:
+    """
+    Clarke-Wright Savings Heuristic for the Vehicle Routing Problem of
+    CVRPModel. Every customer starts on its own route, and routes are joined
+    end to start in order of the savings d[i][0] + d[0][j] - shape * d[i][j],
+    taken from a heap, as long as the vehicle capacity allows it and there
+    are more than K routes. Of the routes that remain the K most profitable
+    are kept, customers that cost more to visit than they earn are dropped
+    and customers that are not visited are inserted where that is
+    profitable. The most profitable routes over all shapes are the result.
+
+    Arguments:
+        Q       (int)   : capacity constraint of vehicles
+        r       (int)   : profit per demand
+        K       (int)   : number of vehicles to use
+        f       (int)   : fixed cost of using a vehicle
+        dist    (list)  : 2D map of n * n customer, where dist[i][j] represents
+                          the distance from node i to j
+        demand  (list)  : list of demands, where d[0] = 0 (source depot)
+        shapes  (tuple) : route shape parameters to try, 1 is the classic
+                          savings, lower values favour joining customers
+                          far from the depot
+    """
+
+    def __init__(self, Q, r, K, f, dist, demand, shapes=(1, 0.8, 0.6, 0.4)):
+        self.dist = as_distance_provider(dist)
+        self.n = len(self.dist)
+        self.K = K
+        self.f = f
+        self.demand = list(demand)
+        self.Q = Q
+        self.r = r
+        self.shapes = shapes
+        customers = [j for j in range(1, self.n) if self.demand[j] <= Q]
+        if len(customers) < K:
+            raise ValueError("{} vehicles need at least {} customers".format(
+                K, K))
+        self.customers = customers
+
+    def optimize(self):
+        """
+        Builds the routes for every shape and keeps the most profitable,
+        sets .ObjVal to their profit
+        """
+        d = np.asarray(self.dist)
+        symmetric = np.array_equal(d, d.T)
+        best = None
+        for shape in self.shapes:
+            self.routes = self.merge_routes(shape, symmetric)
+            _drop_customers(self.routes, self.dist, self.demand, self.r)
+            _insert_customers(self.routes, self.customers, self.dist,
+                              self.demand, self.Q, self.r)
+            profit = sum(self.route_profit(route[1:-1])
+                         for route in self.routes) - self.f * self.K
+            if best is None or profit > best[0]:
+                best = (profit, self.routes)
+        self.ObjVal, self.routes = best
+
+    def merge_routes(self, shape, symmetric):
+        """
+        Returns the K most profitable routes [0, ..., 0] after joining routes
+        in order of the savings with route shape parameter shape
+        """
+        routes = {j: [j] for j in self.customers}
+        route_of = {j: j for j in self.customers}
+        load = {j: self.demand[j] for j in self.customers}
+
+        savings = self.savings(shape, symmetric)
+        while savings and len(routes) > self.K:
+            _, i, j = heappop(savings)
+            a, b = route_of[i], route_of[j]
+            if a == b or load[a] + load[b] > self.Q:
+                continue
+            A, B = routes[a], routes[b]
+            if symmetric:
+                # Routes can be driven in both directions
+                if A[0] == i and len(A) > 1:
+                    A.reverse()
+                if B[-1] == j and len(B) > 1:
+                    B.reverse()
+            if A[-1] != i or B[0] != j:
+                continue
+            A.extend(B)
+            load[a] += load.pop(b)
+            del routes[b]
+            for node in B:
+                route_of[node] = a
+
+        # Keep the K most profitable routes, there is a vehicle for each
+        routes = sorted(routes.values(), key=self.route_profit, reverse=True)
+        return [[0] + route + [0] for route in routes[:self.K]]
+
+    def savings(self, shape, symmetric):
+        """
+        Returns the heap of savings (-saving, i, j) of visiting customer j
+        right after customer i, for symmetric distances only i < j
+        """
+        d = np.asarray(self.dist, dtype=np.float64)
+        customers = np.array(self.customers)
+        i, j = np.meshgrid(customers, customers, indexing="ij")
+        keep = i < j if symmetric else i != j
+        i, j = i[keep], j[keep]
+        saving = d[i, 0] + d[0, j] - shape * d[i, j]
+        savings = list(zip((-saving).tolist(), i.tolist(), j.tolist()))
+        heapify(savings)
+        return savings
+
+    def route_profit(self, route):
+        """
+        Returns the revenue minus the transport costs of the customers
+        route, visited from and back to the depot
+        """
+        d = self.dist.item
+        stops = [0] + route + [0]
+        return (self.r * sum(self.demand[j] for j in route) -
+                sum(d(a, b) for a, b in zip(stops[:-1], stops[1:])))
+
+    def get_vehicle_tour(self, k):
+        """
+        Returns the tour [0, ..., 0] of vehicle k
+        """
+        return self.routes[k]
+
+    def get_tours(self):
+        """
+        Returns the tours of all vehicles, in the format of
+        CVRPModel.get_tours, e.g. to use as CVRPModel.set_start
+        """
+        return [self.get_vehicle_tour(k) for k in range(self.K)]
+
+
+def _drop_customers(routes, dist, demand, r):
+    """
+    Removes customers from the routes [0, ..., 0] that cost more to visit
+    than their revenue, every route keeps at least one customer
+    """
+    d = dist.item
+    improved = True
+    while improved:
+        improved = False
+        for route in routes:
+            p = 1
+            while p < len(route) - 1 and len(route) > 3:
+                a, j, b = route[p - 1], route[p], route[p + 1]
+                if d(a, j) + d(j, b) - d(a, b) > r * demand[j]:
+                    del route[p]
+                    improved = True
+                else:
+                    p += 1
+
+
+def _insert_customers(routes, customers, dist, demand, Q, r):
+    """
+    Inserts each customer that is not visited, largest demand first, at the
+    cheapest position of a route with enough capacity left, if its revenue
+    exceeds the extra distance
+    """
+    d = np.asarray(dist, dtype=np.float64)
+    visited = {j for route in routes for j in route}
+    loads = [sum(demand[j] for j in route) for route in routes]
+    unvisited = [j for j in customers if j not in visited]
+    for j in sorted(unvisited, key=lambda j: -demand[j]):
+        best = None
+        for k, route in enumerate(routes):
+            if loads[k] + demand[j] > Q:
+                continue
+            a, b = np.array(route[:-1]), np.array(route[1:])
+            added = d[a, j] + d[j, b] - d[a, b]
+            p = int(np.argmin(added))
+            if best is None or added[p] < best[0]:
+                best = (added[p], k, p + 1)
+        if best is not None and best[0] < r * demand[j]:
+            routes[best[1]].insert(best[2], j)
+            loads[best[1]] += demand[j]
+
+
+def _route_cluster(args):
+    """
+    Returns the tour [0, ..., 0] through the locations of tsp_data, with the
+    depot as location 0, found by solver (see ClusterFirstRouteSecond).
+    LocalSearch only handles symmetric distances, asymmetric routes above
+    exact_size are solved by tsp_model instead.
+    """
+    tsp_data, solver, exact_size, symmetric = args
+    dist = tsp_data[1]
+    n = len(dist)
+    if n <= 3:
+        # The only tour, or the cheaper of its two directions
+        tour = list(range(n)) + [0]
+        return min(tour, tour[::-1],
+                   key=lambda tour: sum(dist[i][j]
+                                        for i, j in zip(tour[:-1], tour[1:])))
+    if solver == "mip" or (not symmetric and n > exact_size):
+        model = tsp_model(n, tsp_data=tsp_data)
+        model.optimize(verbose=False)
+        return model.tours[0]
+    if n <= exact_size:
+        model = DynamicProgramming(n, tsp_data=tsp_data)
+        model.optimize()
+        return model.tour
+    start = NearestNeighbour(n, tsp_data=tsp_data)
+    start.optimize()
+    model = LocalSearch(n, tour=start.tour, tsp_data=tsp_data)
+    model.optimize()
+    return model.tour
+
+
+class ClusterFirstRouteSecond:
+    """
+    Cluster-first route-second heuristic for the Vehicle Routing Problem of
+    CVRPModel. The customers are split into clusters that fit in a vehicle,
+    the TSP of every cluster (with the depot) is solved in parallel, and the
+    K most profitable routes are kept. As in SavingsHeuristic, customers
+    that cost more to visit than they earn are then dropped and customers
+    that are not visited are inserted where that is profitable.
+
+    Clusters are made by a sweep around the depot by polar angle, which
+    needs the locations, or by capacity-aware k-medoids on the distances.
+    The routes are solved by DynamicProgramming up to exact_size locations
+    and by NearestNeighbour followed by LocalSearch above that, or by
+    tsp_model (Gurobi) if solver is "mip". LocalSearch needs symmetric
+    distances, with asymmetric distances the routes above exact_size are
+    solved by tsp_model as well.
+
+    Arguments:
+        Q          (int)   : capacity constraint of vehicles
+        r          (int)   : profit per demand
+        K          (int)   : number of vehicles to use
+        f          (int)   : fixed cost of using a vehicle
+        dist       (list)  : 2D map of n * n customer, where dist[i][j]
+                             represents the distance from node i to j
+        demand     (list)  : list of demands, where d[0] = 0 (source depot)
+        location   (list)  : (x, y) of every location, for the sweep
+        method     (str)   : "sweep" or "medoids", sweep if location is given
+        solver     (str)   : "heuristic" or "mip"
+        exact_size (int)   : largest route solved by DynamicProgramming
+        processes  (int)   : number of worker processes, all cores if None,
+                             1 solves all routes in this process
+    """
+
+    def __init__(self, Q, r, K, f, dist, demand, location=None, method=None,
+                 solver="heuristic", exact_size=12, processes=None):
+        self.dist = np.asarray(dist)
+        self.symmetric = np.array_equal(self.dist, self.dist.T)
+        self.n = len(self.dist)
+        self.K = K
+        self.f = f
+        self.demand = list(demand)
+        self.Q = Q
+        self.r = r
+        self.location = None if location is None else np.asarray(location)
+        if method is None:
+            method = "medoids" if location is None else "sweep"
+        if method == "sweep" and location is None:
+            raise ValueError("The sweep needs the locations")
+        self.method = method
+        self.solver = solver
+        self.exact_size = exact_size
+        self.processes = processes
+        self.customers = [j for j in range(1, self.n) if self.demand[j] <= Q]
+        if len(self.customers) < K:
+            raise ValueError("{} vehicles need at least {} customers".format(
+                K, K))
+
+    def optimize(self):
+        """
+        Clusters the customers, solves the route of every cluster and sets
+        .ObjVal to the profit of the K most profitable routes
+        """
+        start_time = time.perf_counter()
+        if self.method == "sweep":
+            self.clusters = self.sweep()
+        else:
+            self.clusters = self.medoids()
+        routes = self.solve_routes(self.clusters)
+        routes.sort(key=self.route_profit, reverse=True)
+        self.routes = routes[:self.K]
+        _drop_customers(self.routes, self.dist, self.demand, self.r)
+        _insert_customers(self.routes, self.customers, self.dist,
+                          self.demand, self.Q, self.r)
+        self.ObjVal = sum(self.route_profit(route)
+                          for route in self.routes) - self.f * self.K
+        self.runtime = time.perf_counter() - start_time
+
+    def sweep(self):
+        """
+        Returns clusters of customers made by sweeping a ray around the
+        depot, starting in the largest angle between two customers. A
+        cluster is closed when the next customer does not fit in it anymore.
+        There are at least K clusters, the largest are split if needed.
+        """
+        customers = np.array(self.customers)
+        offset = self.location[customers] - self.location[0]
+        angle = np.arctan2(offset[:, 1], offset[:, 0])
+        order = np.argsort(angle, kind="stable")
+        gaps = np.diff(np.r_[angle[order], angle[order[0]] + 2 * np.pi])
+        order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+
+        clusters = [[]]
+        load = 0
+        for j in customers[order].tolist():
+            if load + self.demand[j] > self.Q:
+                clusters.append([])
+                load = 0
+            clusters[-1].append(j)
+            load += self.demand[j]
+
+        while len(clusters) < self.K:
+            largest = max(range(len(clusters)),
+                          key=lambda c: len(clusters[c]))
+            cluster = clusters.pop(largest)
+            half = len(cluster) // 2
+            clusters[largest:largest] = [cluster[:half], cluster[half:]]
+        return clusters
+
+    def medoids(self, iterations=10):
+        """
+        Returns K clusters around K medoids. Customers are assigned nearest
+        first to the nearest medoid that has capacity left, customers that
+        fit nowhere are not visited. The medoid of each cluster is then moved
+        to its most central customer, until the medoids do not change.
+        """
+        d = self.dist
+        customers = np.array(self.customers)
+        # Spread the first medoids: each next one is furthest from the others
+        medoids = [int(customers[np.argmax(d[0, customers])])]
+        while len(medoids) < self.K:
+            nearest = d[np.ix_(medoids, customers)].min(axis=0)
+            medoids.append(int(customers[np.argmax(nearest)]))
+
+        for _ in range(iterations):
+            clusters = [[m] for m in medoids]
+            loads = [self.demand[m] for m in medoids]
+            others = np.setdiff1d(customers, medoids)
+            to_medoid = d[np.ix_(others, medoids)]
+            for row in np.argsort(to_medoid.min(axis=1), kind="stable"):
+                j = int(others[row])
+                for c in np.argsort(to_medoid[row], kind="stable").tolist():
+                    if loads[c] + self.demand[j] <= self.Q:
+                        clusters[c].append(j)
+                        loads[c] += self.demand[j]
+                        break
+            central = [
+                cluster[int(np.argmin(d[np.ix_(cluster, cluster)].sum(axis=1)))]
+                for cluster in clusters
+            ]
+            if central == medoids:
+                break
+            medoids = central
+        return clusters
+
+    def solve_routes(self, clusters):
+        """
+        Returns the tour [0, ..., 0] of every cluster, solved in parallel
+        """
+        tasks = []
+        for cluster in clusters:
+            nodes = [0] + cluster
+            location = None
+            if self.location is not None:
+                location = self.location[nodes]
+            tasks.append(((location, self.dist[np.ix_(nodes, nodes)]),
+                          self.solver, self.exact_size, self.symmetric))
+        if self.processes == 1 or len(tasks) == 1:
+            tours = [_route_cluster(task) for task in tasks]
+        else:
+            with Pool(self.processes) as pool:
+                tours = pool.map(_route_cluster, tasks)
+        return [[([0] + cluster)[i] for i in tour]
+                for tour, cluster in zip(tours, clusters)]
+
+    def route_profit(self, route):
+        """
+        Returns the revenue minus the transport costs of route [0, ..., 0]
+        """
+        return (self.r * sum(self.demand[j] for j in route) -
+                self.dist[route[:-1], route[1:]].sum().item())
+
+    def get_vehicle_tour(self, k):
+        """
+        Returns the tour [0, ..., 0] of vehicle k
+        """
+        return self.routes[k]
+
+    def get_tours(self):
+        """
+        Returns the tours of all vehicles, in the format of
+        CVRPModel.get_tours, e.g. to use as CVRPModel.set_start
+        """
+        return [self.get_vehicle_tour(k) for k in range(self.K)]
+
+    def plot(self, name):
+        """
+		Plots the routes of the vehicles
+		"""
+        plot(self.location, self.routes, name)
+
+
+def build_report(model_class, sizes, **kwargs):
+    """
+    Prints a markdown table comparing the build time of the loop-based and
+    the bulk (fast_build) construction of a model class
+
+    Arguments:
+        model_class (class) : DifferentGraph or TimeSpaceNetwork
+        sizes (list)        : instance sizes n to build
+        kwargs              : passed on to the model constructor
+
+    Returns:
+        report (list) : (n, variables, constraints, loop time, bulk time)
+                        for each n
+    """
+    report = []
+    print("| n | variables | constraints | loops (s) | bulk (s) | speedup |")
+    print("| - | --------- | ----------- | --------- | -------- | ------- |")
+    for n in sizes:
+        loops = model_class(n, verbose=False, fast_build=False, **kwargs)
+        bulk = model_class(n, verbose=False, fast_build=True, **kwargs)
+        report.append((n, bulk.m.NumVars, bulk.m.NumConstrs,
+                       loops.build_time, bulk.build_time))
+        print(f"| {n} | {bulk.m.NumVars} | {bulk.m.NumConstrs} | "
+              f"{loops.build_time:.3f} | {bulk.build_time:.3f} | "
+              f"{loops.build_time / bulk.build_time:.1f}x |")
+    return report
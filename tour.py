@@ -0,0 +1,162 @@
+from array import array
+
+import numpy as np
+
+# Segments longer than this are updated through numpy views of the arrays
+_VECTOR_LENGTH = 32
+
+
+class Tour:
+    """
+    Cyclic tour stored as two int32 arrays: the order of the locations and
+    the position of every location in that order, so positions, successors
+    and predecessors are found in O(1) and moves are applied in place
+
+    Arguments:
+        nodes (list) : tour of locations 0 to n-1, closed ([i, ..., i]) or
+                       open
+    """
+
+    def __init__(self, nodes):
+        nodes = list(nodes)
+        if len(nodes) > 1 and nodes[0] == nodes[-1]:
+            nodes.pop()
+        self.n = len(nodes)
+        self.order = array('i', nodes)
+        self.pos = array('i', bytes(4 * self.n))
+        # numpy views that share memory with order and pos
+        self._order = np.frombuffer(self.order, dtype=np.int32)
+        self._pos = np.frombuffer(self.pos, dtype=np.int32)
+        self._pos[self._order] = np.arange(self.n, dtype=np.int32)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, p):
+        """
+        Returns the location at position p, positions wrap around
+        """
+        return self.order[p % self.n]
+
+    def position(self, i):
+        return self.pos[i]
+
+    def succ(self, i):
+        return self.order[(self.pos[i] + 1) % self.n]
+
+    def pred(self, i):
+        return self.order[self.pos[i] - 1]
+
+    def to_list(self, start=None):
+        """
+        Returns the closed tour [start, ..., start] as a list, starting from
+        the location at position 0 if start is omitted
+        """
+        p = 0 if start is None else self.pos[start]
+        nodes = (self.order[p:] + self.order[:p]).tolist()
+        return nodes + nodes[:1]
+
+    def cost(self, dist):
+        """
+        Returns the length of the tour
+        """
+        return sum(dist[self.order[p - 1]][self.order[p]]
+                   for p in range(self.n))
+
+    def reverse(self, i, j):
+        """
+        Reverses the tour from position i up to and including position j,
+        or the rest of the tour if that is shorter (same cyclic tour)
+        """
+        n, order, pos = self.n, self.order, self.pos
+        m = (j - i) % n + 1
+        if 2 * m > n:
+            i, j, m = (j + 1) % n, (i - 1) % n, n - m
+        if m < 2:
+            return
+        if i <= j:
+            order[i:j + 1] = order[i:j + 1][::-1]
+            self._update_pos(i, m)
+            return
+        if m > _VECTOR_LENGTH:
+            p = (i + np.arange(m)) % n
+            self._order[p] = self._order[p[::-1]]
+            self._pos[self._order[p]] = p
+            return
+        for t in range(m // 2):
+            p, q = (i + t) % n, (j - t) % n
+            order[p], order[q] = order[q], order[p]
+            pos[order[p]] = p
+            pos[order[q]] = q
+
+    def move(self, p, q):
+        """
+        Moves the location at position p to position q, the locations in
+        between shift one position towards p (list.insert(q, list.pop(p)))
+        """
+        if p == q:
+            return
+        order = self.order
+        node = order[p]
+        if p < q:
+            order[p:q] = order[p + 1:q + 1]
+        else:
+            order[q + 1:p + 1] = order[q:p]
+        order[q] = node
+        self._update_pos(min(p, q), abs(p - q) + 1)
+
+    def move_segment(self, i, length, x, forward):
+        """
+        Moves the segment of length locations from position i to between x
+        and succ(x), reversed if not forward. Only the shorter side of the
+        tour between the segment and x is shifted.
+        """
+        n, order, pos = self.n, self.order, self.pos
+        segment = [order[(i + t) % n] for t in range(length)]
+        if not forward:
+            segment.reverse()
+        j = (i + length) % n
+        middle = (pos[x] - j) % n + 1
+        if middle <= n - length - middle:
+            # Shift succ(segment)...x back over the segment
+            self._shift(j, i, middle)
+            start = (i + middle) % n
+        else:
+            # Shift succ(x)...pred(segment) forward over the segment
+            start = (pos[x] + 1) % n
+            self._shift(start, (start + length) % n, n - length - middle)
+        for t, node in enumerate(segment):
+            order[(start + t) % n] = node
+            pos[node] = (start + t) % n
+
+    def _shift(self, source, target, count):
+        """
+        Copies the count locations from position source onwards to position
+        target onwards (cyclic), overlapping ranges are copied safely
+        """
+        n, order, pos = self.n, self.order, self.pos
+        if count > _VECTOR_LENGTH:
+            p = np.arange(count)
+            q = (target + p) % n
+            self._order[q] = self._order[(source + p) % n]
+            self._pos[self._order[q]] = q
+            return
+        steps = range(count)
+        if (target - source) % n < count:
+            steps = reversed(steps)
+        for t in steps:
+            node = order[(source + t) % n]
+            order[(target + t) % n] = node
+            pos[node] = (target + t) % n
+
+    def _update_pos(self, start, count):
+        """
+        Updates the position index of positions start to start + count - 1
+        """
+        if count > _VECTOR_LENGTH:
+            p = np.arange(start, start + count, dtype=np.int32)
+            self._pos[self._order[start:start + count]] = p
+            return
+        order, pos = self.order, self.pos
+        for p in range(start, start + count):
+            pos[order[p]] = p
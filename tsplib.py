@@ -0,0 +1,123 @@
+import numpy as np
+
+from distances import METRICS, CoordinateDistances, DenseDistances
+
+# Number of entries of an explicit EDGE_WEIGHT_SECTION, per format
+_EXPLICIT_SIZES = {
+    "FULL_MATRIX": lambda n: n * n,
+    "UPPER_ROW": lambda n: n * (n - 1) // 2,
+    "LOWER_ROW": lambda n: n * (n - 1) // 2,
+    "UPPER_DIAG_ROW": lambda n: n * (n + 1) // 2,
+    "LOWER_DIAG_ROW": lambda n: n * (n + 1) // 2,
+}
+
+
+def read_tsplib(path):
+    """
+    Reads a TSPLIB file (.tsp), one line at a time. Coordinate instances
+    (EDGE_WEIGHT_TYPE EUC_2D, CEIL_2D or ATT) get a CoordinateDistances
+    instead of a distance matrix, explicit instances (FULL_MATRIX,
+    UPPER_ROW, LOWER_ROW, UPPER_DIAG_ROW or LOWER_DIAG_ROW) get a
+    DenseDistances of an int32 matrix. Either way all models of the instance
+    share one neighbour index. TSPLIB node ids 1 to n become locations 0 to
+    n-1.
+
+    Parameters:
+        path (str): path of the TSPLIB file
+
+    Returns:
+        (location, dist) :
+                location:   (n, 2) array of (x, y) coordinates, None for
+                            explicit instances without DISPLAY_DATA_SECTION
+                dist:       (n, n) DistanceProvider, can be passed as
+                            tsp_data to the heuristics in models.py
+    """
+    specification = {}
+    location = None
+    weights = None
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            keyword = line.split(":")[0].strip().upper()
+            if keyword == "EOF":
+                break
+            elif keyword in ("NODE_COORD_SECTION", "DISPLAY_DATA_SECTION"):
+                location = _read_coordinates(file, _dimension(specification))
+            elif keyword == "EDGE_WEIGHT_SECTION":
+                weights = _read_weights(file, specification)
+            elif ":" in line:
+                specification[keyword] = line.split(":", 1)[1].strip()
+
+    n = _dimension(specification)
+    weight_type = specification.get("EDGE_WEIGHT_TYPE", "EXPLICIT").upper()
+    if weight_type == "EXPLICIT":
+        if weights is None:
+            raise ValueError("{}: missing EDGE_WEIGHT_SECTION".format(path))
+        dist = DenseDistances(_explicit_matrix(weights, n, specification))
+    elif weight_type in METRICS:
+        if location is None:
+            raise ValueError("{}: missing NODE_COORD_SECTION".format(path))
+        dist = CoordinateDistances(location, weight_type, path=path)
+    else:
+        raise ValueError("{}: EDGE_WEIGHT_TYPE {} is not supported".format(
+            path, weight_type))
+    return (location, dist)
+
+
+def _dimension(specification):
+    if "DIMENSION" not in specification:
+        raise ValueError("TSPLIB file without DIMENSION")
+    return int(specification["DIMENSION"])
+
+
+def _read_coordinates(file, n):
+    """
+    Reads the n lines "id x y" of a NODE_COORD_SECTION
+    """
+    location = np.empty((n, 2))
+    for _ in range(n):
+        node, x, y = next(file).split()[:3]
+        location[int(node) - 1] = (float(x), float(y))
+    if np.all(location == np.round(location)):
+        return location.astype(np.int32)
+    return location
+
+
+def _read_weights(file, specification):
+    """
+    Reads the numbers of an EDGE_WEIGHT_SECTION, which can be spread over
+    any number of lines
+    """
+    n = _dimension(specification)
+    edge_format = specification.get("EDGE_WEIGHT_FORMAT", "").upper()
+    if edge_format not in _EXPLICIT_SIZES:
+        raise ValueError(
+            "EDGE_WEIGHT_FORMAT {} is not supported".format(edge_format))
+    weights = np.empty(_EXPLICIT_SIZES[edge_format](n))
+    filled = 0
+    while filled < len(weights):
+        values = next(file).split()
+        weights[filled:filled + len(values)] = values
+        filled += len(values)
+    return weights
+
+
+def _explicit_matrix(weights, n, specification):
+    """
+    Returns the symmetric n * n matrix of the explicit weights
+    """
+    edge_format = specification["EDGE_WEIGHT_FORMAT"].upper()
+    if edge_format == "FULL_MATRIX":
+        dist = weights.reshape(n, n)
+    else:
+        offset = 0 if "DIAG" in edge_format else 1
+        if edge_format.startswith("UPPER"):
+            rows, columns = np.triu_indices(n, offset)
+        else:
+            rows, columns = np.tril_indices(n, -offset)
+        dist = np.zeros((n, n))
+        dist[rows, columns] = weights
+        dist[columns, rows] = weights
+    return dist.astype(np.int32)